@@ -0,0 +1,715 @@
+# the filter analyses behind rftune: selecting filters from the
+# coefficient tables, analyzing and reporting them, and batch jobs
+
+import numpy as np
+import argparse, csv, json, math, pickle, sys
+import concurrent.futures, itertools, os
+
+import tables   # COUPLED, ZVEREV and LOWPASS load on first use
+import montecarlo
+import search
+import touchstone
+from index import index
+
+from ness import (
+    prototype_qk, denormalize_qk, coupling_g, db, chebyshev,   # helpers
+    nodal_delay_transmission, nodal_insertionloss,             # measurements at fo
+    nodal_returnloss, nodal_delay_bandwidth, nodal_bandwidth,  # approximations
+    lowpass_groupdelay, lowpass_bandwidth,                     # approximations
+    groupdelay_maqu, groupdelay_tdqu,   # lossy
+    groupdelay_qk,                      # lossless
+    qequ_groupdelay, k12_groupdelay,    # validation
+    fn_nodal_transmission, groupdelay,  # when re != zo
+    nodal_timedomain, timedomain_extrema, TD_POINTS,   # time domain
+    nodal_sensitivity,                  # jacobians
+    coupling_matrix, fn_matrix_reflection, fn_matrix_transmission,  # coupling matrix
+    matrix_ness, returnloss, bandedges,
+    cache,
+)
+from options import make_parser
+from reverse import reverse
+
+
+def list_qk(qk, bw, fo):
+    QK = denormalize_qk(qk, bw, fo)
+    for i in range(len(QK)):
+        name1, name2, name3 = f'k{i}{i+1}', f'K{i}{i+1}', f'BW{i}{i+1}'
+        if i == 0: name1, name2, name3 = 'q1', 'Q1', 'BW1'
+        if i == len(QK)-1: name1, name2, name3 = f'q{i}', f'Q{i}', f'BW{i}'
+        print('  {:4s} {:11.6f}   |   {:4s} {:11.6f}   |   {:4s} {:11.5f} MHz'
+              .format(name1, qk[i], name2, QK[i], name3, qk[i] * bw / 1e6))
+
+
+def list_g(g):
+    for i in range(len(g)):
+        print('  {:4s} {:11.6f}'.format(f'g{i}', g[i]))
+
+
+def list_groupdelays(TD1, TD2, MA1, MA2):
+    N = len(TD1)
+    width = len(' '.join([ str(i) for i in range(1, N+1) ]))
+    for n in range(N):
+        res1 = ' '.join([ str(i) for i in range(1, n+2) ])
+        res2 = ' '.join([ str(i) for i in range(N, N-n-1, -1) ])
+        print('  {} {:9.3f} ns {:7.3f} dB   |   {} {:9.3f} ns {:7.3f} dB'.format(
+              res1.ljust(width), TD1[n] * 1e9, db(1/MA1[n]),
+              res2.ljust(width), TD2[n] * 1e9, db(1/MA2[n])))
+
+
+#######################
+# analysis
+#######################
+
+def table_name(args):
+    if args.g:
+        return 'LOWPASS'
+    elif args.predistorted:
+        return 'ZVEREV'
+    else:
+        return 'COUPLED'
+
+
+def select_table(args):
+    return tables.load(table_name(args))
+
+
+# the predistorted rows of a family interpolated at args.q0, or at the
+# q0 of the resonators from QU, fo and bw, one per design branch
+def interpolate(catalog, family, args):
+    q0 = args.q0
+    if not q0:
+        fo, bw, qu = args.frequency, args.bandwidth, args.qu
+        if not (fo and bw) or np.isinf(qu):
+            raise ValueError('Interpolation needs --q0, or QU, center frequency and bandwidth.')
+        q0 = round(qu * bw / fo, 3)
+    values = [ row for key, row in catalog.interpolate(*family, args.number, q0) ]
+    if not values:
+        raise ValueError('q0 = {:g} is beyond the predistorted filters.'.format(q0))
+    return values
+
+
+# return the list of filters selected by args
+def select_filters(args):
+    catalog = index(table_name(args))
+    lowpass = args.g
+
+    if not args.number:
+        raise ValueError("Number of poles not set.")
+    if args.interpolate and not args.predistorted:
+        raise ValueError('--interpolate needs -p.')
+
+    # pull tables
+    if args.butterworth:
+        family = ('butterworth', None)
+    elif args.bessel:
+        family = ('bessel', None)
+    elif args.legendre:
+        family = ('legendre', None)
+    elif args.chebyshev:
+        family = ('chebyshev', args.chebyshev)
+    elif args.gaussian:
+        family = ('gaussian', args.gaussian)
+    elif args.linear_phase:
+        family = ('linear phase', args.linear_phase)
+    elif args.max_ripple or args.max_swr or args.max_rc:
+        family = None
+        lowpass = True
+        if args.max_swr:
+            swr = args.max_swr
+            rc = (swr - 1) / (swr + 1)
+            ripple = -10 * np.log10(1 - rc**2)
+        if args.max_rc:
+            rc = args.max_rc
+            ripple = -10 * np.log10(1 - rc**2)
+        if args.max_ripple:
+            ripple = args.max_ripple
+        name, values = ('Chebyshev {:.4g} dB'.format(ripple), 
+                        [chebyshev(args.number, ripple)]) 
+    else:
+        raise ValueError('No filter type specified.')
+
+    if family:
+        # a family without a parameter in its name, such as ZVEREV's
+        # Gaussian, matches any parameter that has no row of its own
+        if catalog.find(*family) is None:
+            family = (family[0], None)
+        name = catalog.find(*family)
+        if args.predistorted and args.interpolate:
+            values = interpolate(catalog, family, args)
+        elif args.predistorted and args.q0:
+            res = catalog.nearest(*family, args.number, args.q0)
+            values = [ res[1] ] if res else []
+        else:
+            values = catalog.lookup(*family, args.number)
+        # orders without a row are synthesized where the family allows
+        if not values and family[1] is None:
+            res = tables.synthesize(table_name(args), family[0], args.number)
+            if res:
+                name, values = res[0], [ list(res[1]) ]
+        if name is None:
+            raise ValueError('Filter not found.')
+
+    # collect data
+    data = []
+    for row in values:
+        d = {}
+        d['name'] = name
+        if lowpass:
+            if args.predistorted:
+                raise ValueError('No predistorted lowpass prototypes.')
+            g = row
+            d['g'] = g
+            d['qk'] = coupling_g(g)
+        else:
+            if args.predistorted:
+                d['qo'] = row[0]
+                row = row[2:]
+            qk = row[:1] + row[2:] + row[1:2] 
+            d['qk'] = qk
+            d['g'] = prototype_qk(qk)
+        data.append(d)
+    return data
+
+
+# analyze a filter from select_filters, returning its results
+def analyze(d, args):
+    bw = args.bandwidth
+    fo = args.frequency
+    qu = args.qu
+    qk = d['qk']
+    g = d['g']
+    N = len(g) - 2
+    r = dict(d, N=N, fo=fo, bw=bw, qu=qu)
+
+    if args.lowpass:
+        r['fp'], r['td'] = lowpass_groupdelay(g, fo, qu)
+        r['fpeak'], r['tdpeak'] = lowpass_bandwidth(g, fo, qu)
+        return r
+
+    if bw and fo:
+        r['bwtd'] = nodal_delay_bandwidth(qk, bw, fo, qu) # step
+        r['bwdb'] = nodal_bandwidth(qk, bw, fo, qu) # step
+        r['td'] = nodal_delay_transmission(qk, bw, fo, qu)
+        r['rl'] = nodal_returnloss(qk, bw, fo, qu) # step
+        r['il'] = nodal_insertionloss(qk, bw, fo, qu) # step
+        r['QL'] = fo / bw
+        r['q0'] = qu / (fo / bw)
+        r['QK'] = denormalize_qk(qk, bw, fo)
+
+    if bw:
+        r['lossless'] = {
+            'TD1': groupdelay_qk(qk, bw),
+            'TD2': groupdelay_qk(qk[::-1], bw),
+        }
+
+    if bw and fo and (args.coupling_matrix or args.cross or args.resonator_qu):
+        r['matrix'] = analyze_matrix(qk, bw, fo, qu, args)
+
+    if bw and fo and args.sensitivity:
+        r['sensitivity'] = nodal_sensitivity(qk, bw, fo, qu)
+
+    if bw and fo and args.time_domain:
+        r['timedomain'] = analyze_timedomain(qk, bw, fo, qu, args)
+
+    if bw and fo and args.monte_carlo:
+        r['montecarlo'] = montecarlo.yield_analysis(
+            qk, bw, fo, qu, args.monte_carlo, args.tolerance, args.distribution,
+            args.seed, il=args.spec_il, rl=args.spec_rl, bwdb=args.spec_bw)
+
+    if bw and fo and not np.isinf(qu):
+        MA1 = groupdelay_maqu(g, bw, fo, qu)
+        TD1 = groupdelay_tdqu(g, bw, fo, qu)
+        MA2 = groupdelay_maqu(g[::-1], bw, fo, qu)
+        TD2 = groupdelay_tdqu(g[::-1], bw, fo, qu)
+        r['ness'] = { 'TD1': TD1, 'TD2': TD2, 'MA1': MA1, 'MA2': MA2 }
+
+        if args.re != args.zo:
+            gcopy = g.copy()
+            gcopy[0] *= args.zo / args.re
+            MA1 = groupdelay_maqu(gcopy, bw, fo, qu)
+            TD1 = groupdelay_tdqu(gcopy, bw, fo, qu)
+            gcopy = g[::-1].copy()
+            gcopy[0] *= args.zo / args.re
+            MA2 = groupdelay_maqu(gcopy, bw, fo, qu)
+            TD2 = groupdelay_tdqu(gcopy, bw, fo, qu)
+            fn = fn_nodal_transmission(qk, bw, fo, re=args.zo/args.re)
+            r['mismatch'] = {
+                'TD1': TD1, 'TD2': TD2, 'MA1': MA1, 'MA2': MA2,
+                'zo': args.zo, 're': args.re,
+                'td': groupdelay(fn, fo, qu),
+                'il': -db(fn(fo, qu)),
+                'QE1': fo / bw * qk[0] * args.zo / args.re,
+                'QE2': fo / bw * qk[-1] * args.zo / args.re,
+            }
+
+        if args.validate:
+            qe1, qu1 = qequ_groupdelay(fo, TD1[0], MA1[0])
+            qe2, qu2 = qequ_groupdelay(fo, TD2[0], MA2[0])
+            r['validate'] = {
+                'QU1': qu1, 'QU2': qu2, 'QE1': qe1, 'QE2': qe2,
+                'K12': k12_groupdelay(fo, TD1[0], TD1[1], MA1[0]),
+                'K21': k12_groupdelay(fo, TD2[0], TD2[1], MA2[0]),
+            }
+    return r
+
+
+# the response and the Ness delays of a filter from its coupling
+# matrix, with the cross couplings of args.cross and the unloaded Qs
+# of args.resonator_qu; the QU of each resonator is passed as its
+# scale qr, with qu = 1
+def analyze_matrix(qk, bw, fo, qu, args):
+    N = len(qk) - 1
+    qr = np.full(N, float(qu))
+    for n, x in (args.resonator_qu or {}).items():
+        if not 1 <= n <= N:
+            raise ValueError('No resonator {} in a {} pole filter.'.format(n, N))
+        qr[n-1] = x
+    m, re = coupling_matrix(qk, args.cross)
+    s11 = fn_matrix_reflection(qk, bw, fo, args.cross, qr)
+    s21 = fn_matrix_transmission(qk, bw, fo, args.cross, qr)
+    edges = bandedges(s21, bw, fo, 1)
+    TD1, MA1 = matrix_ness(m, re, bw, fo, 1, qr)
+    TD2, MA2 = matrix_ness(m[::-1,::-1], re[::-1], bw, fo, 1, qr[::-1])
+    return {
+        'M': m, 'R': re, 'QU': qr,
+        'bwdb': np.nan if edges is None else edges[2] - edges[1],
+        'td': groupdelay(s21, fo, 1),
+        'rl': returnloss(s11, bw, fo, 1),
+        'il': db(s21(fo, np.inf)) - db(s21(fo, 1)),
+        'TD1': TD1, 'TD2': TD2, 'MA1': MA1, 'MA2': MA2,
+    }
+
+
+# the dips and peaks of the time-domain S11 and the peak of the
+# time-domain S21 of a filter over the times of args.gate
+def analyze_timedomain(qk, bw, fo, qu, args):
+    span = args.span or 4 * bw
+    if args.gate:
+        start, stop, count = args.gate
+        t = np.linspace(start * 1e-9, stop * 1e-9, count)
+    else:
+        t = np.linspace(0, 2 * max(groupdelay_qk(qk, bw)), TD_POINTS)
+    if len(t) < 3:
+        raise ValueError('The time-domain gate needs at least 3 points.')
+    h11, h21 = nodal_timedomain([ qk ], bw, fo, qu, span, t, window=args.window)
+    dips, peaks = timedomain_extrema(h11[0], t)
+    _, p21 = timedomain_extrema(h21[0], t)
+    return {
+        'window': args.window, 'span': span,
+        'dips': dips, 'peaks': peaks,
+        'S21 peak': p21[np.argmax(np.interp(p21, t, abs(h21[0])))] if p21.size else np.nan,
+    }
+
+
+# evaluate a filter from select_filters over the unloaded
+# Qs in args.qu_sweep, each result being an array over QU
+def analyze_qu_sweep(d, args):
+    bw = args.bandwidth
+    fo = args.frequency
+    qu = args.qu_sweep
+    qk = d['qk']
+    g = d['g']
+    if not (bw and fo):
+        raise ValueError('Center frequency and bandwidth not set.')
+    r = dict(d, N=len(g)-2, fo=fo, bw=bw, qu=qu)
+    r['il'] = nodal_insertionloss(qk, bw, fo, qu)
+    r['rl'] = nodal_returnloss(qk, bw, fo, qu)
+    r['td'] = nodal_delay_transmission(qk, bw, fo, qu)
+    r['TD1'] = groupdelay_tdqu(g, bw, fo, qu)
+    r['MA1'] = groupdelay_maqu(g, bw, fo, qu)
+    r['TD2'] = groupdelay_tdqu(g[::-1], bw, fo, qu)
+    r['MA2'] = groupdelay_maqu(g[::-1], bw, fo, qu)
+    return r
+
+
+# print the results of analyze
+def report(r, args):
+    name = r.get('name')
+    qo = r.get('qo')
+    qk = r['qk']
+    g = r['g']
+    N = r['N']
+    fo = r['fo']
+    bw = r['bw']
+    qu = r['qu']
+
+    print('---------------------------------------')
+    print('{:^39}'.format('{} Pole {}'.format(N, name)))
+    print('---------------------------------------')
+
+    print('Normalized Lowpass Coefficients gi')
+    list_g(g)
+
+    if qo:
+        print('Predistored q0      = {:>15}'.format(str(qo)))
+    if fo:
+        print('Center Frequency    = {:15.5f} MHz'.format(fo / 1e6))
+    if args.lowpass:
+        fp, td = r['fp'], r['td']
+        print('Ness Group Delay of Low Pass Filter (QU={})'.format(qu))
+        for i in range(len(fp)):
+            print('  TD{}  {:11.3f} ns     peak at {:11.5f} MHz '
+                  .format(i+2, td[i] * 1e9, fp[i] / 1e6))
+        print('Group Delay Peak Of Terminated Low Pass Filter (QU={})'.format(qu))
+        print('       {:11.3f} ns     peak at {:11.5f} MHz '
+              .format(r['tdpeak'] * 1e9, r['fpeak'] / 1e6))
+        return
+
+    if bw:
+        print('Design Bandwidth    = {:15.5f} MHz'.format(bw / 1e6))
+    if bw and fo:
+        print('Delay Bandwidth     = {:15.5f} MHz'.format(r['bwtd'] / 1e6))
+        print('3dB Bandwidth       = {:15.5f} MHz'.format(r['bwdb'] / 1e6))
+        print('Transmission Delay  = {:15.3f} ns'.format(r['td'] * 1e9))
+        print('Minimum Return Loss = {:15.3f} dB'.format(r['rl']))
+        print('Insertion Loss      = {:15.3f} dB'.format(r['il']))
+        print('Loaded QL           = {:15.3f}'.format(r['QL']))
+        print('Unloaded QU         = {:15.3f}'.format(qu))
+        print('Normalized q0       = {:15.3f}'.format(r['q0']))
+        print('Normalized and Denormalized qi, kij, and Coupling Bandwidths')
+        list_qk(qk, bw, fo)
+
+    if 'lossless' in r:
+        print('Lossless Ness Group Delay and Return Loss')
+        TD1, TD2 = r['lossless']['TD1'], r['lossless']['TD2']
+        MA = np.ones(len(TD1))
+        list_groupdelays(TD1, TD2, MA, MA)
+
+    if 'ness' in r:
+        print('Ness Group Delay and Return Loss (QU={})'.format(qu))
+        x = r['ness']
+        list_groupdelays(x['TD1'], x['TD2'], x['MA1'], x['MA2'])
+
+    if 'mismatch' in r:
+        print('Filter Termination and Line Impedance Mismatch Results (QU={})'.format(qu))
+        x = r['mismatch']
+        list_groupdelays(x['TD1'], x['TD2'], x['MA1'], x['MA2'])
+        print('  Line Impedance           {:15.3f} ohm'.format(x['zo']))
+        print('  Termination Resistance   {:15.3f} ohm'.format(x['re']))
+        print('  Transmission Delay       {:15.3f} ns'.format(x['td'] * 1e9))
+        print('  Insertion Loss           {:15.3f} dB'.format(x['il']))
+        print('  Empirical QE{}            {:15.3f}'.format(1, x['QE1']))
+        print('  Empirical QE{}            {:15.3f}'.format(N, x['QE2']))
+
+    if 'matrix' in r:
+        x = r['matrix']
+        print('Normalized Coupling Matrix (QU={})'.format(qu))
+        for row in x['M']:
+            print('  ' + ''.join('{:10.5f}'.format(v) for v in row + 0))
+        print('  R1 {:11.6f}   |   R{} {:11.6f}'.format(x['R'][0], N, x['R'][1]))
+        if args.resonator_qu:
+            print('  QU ' + ''.join('{:10.1f}'.format(v) for v in x['QU']))
+        print('  3dB Bandwidth            {:15.5f} MHz'.format(x['bwdb'] / 1e6))
+        print('  Transmission Delay       {:15.3f} ns'.format(x['td'] * 1e9))
+        print('  Minimum Return Loss      {:15.3f} dB'.format(x['rl']))
+        print('  Insertion Loss           {:15.3f} dB'.format(x['il']))
+        print('Coupling Matrix Ness Group Delay and Return Loss')
+        list_groupdelays(x['TD1'], x['TD2'], x['MA1'], x['MA2'])
+
+    if 'sensitivity' in r:
+        x = r['sensitivity']
+        names = [ 'q1' ] + [ f'k{i}{i+1}' for i in range(1, N) ] + [ f'q{N}' ]
+        print('Sensitivity to +1% of each Coefficient (QU={})'.format(qu))
+        print('  {:16s}'.format('') + ''.join('{:>9s}'.format(n) for n in names))
+        def row(name, d, scale):
+            print('  {:16s}'.format(name) +
+                  ''.join('{:9.3f}'.format(v) for v in d * qk / 100 * scale + 0))
+        for port in '12':
+            for i, d in enumerate(x['TD' + port][1]):
+                row('Port {} TD{} ns'.format(port, i + 1), d, 1e9)
+            if not np.isinf(qu):
+                for i, d in enumerate(x['RL' + port][1]):
+                    row('Port {} RL{} dB'.format(port, i + 1), d, 1)
+        row('IL dB', x['il'][1], 1)
+        row('RL dB', x['rl'][1], 1)
+        row('3dB BW MHz', x['bwdb'][1], 1e-6)
+
+    if 'timedomain' in r:
+        x = r['timedomain']
+        print('Time Domain S11 Dips and Peaks ({} window, {:.5f} MHz span)'.format(
+              x['window'], x['span'] / 1e6))
+        for i in range(max(len(x['dips']), len(x['peaks']))):
+            dip = '{:11.3f} ns'.format(x['dips'][i] * 1e9) if i < len(x['dips']) else ''
+            peak = '{:11.3f} ns'.format(x['peaks'][i] * 1e9) if i < len(x['peaks']) else ''
+            print('  {:<4d} dip {:14s}   |   peak {:14s}'.format(i + 1, dip, peak))
+        print('  Time Domain S21 Peak     {:15.3f} ns'.format(x['S21 peak'] * 1e9))
+
+    if 'montecarlo' in r:
+        x = r['montecarlo']
+        print('Monte Carlo Yield ({} samples, {}, seed {})'.format(
+              x['samples'], x['distribution'], x['seed']))
+        print('  Tolerances               {}'.format(', '.join(
+              '{}={:g}%'.format(k, v) for k, v in x['tolerances'].items())))
+        print('  {:24s} {:>11s} {:>11s} {:>11s} {:>11s} {:>7s}'.format(
+              '', 'mean', 'std', 'worst', 'spec', 'pass'))
+        for key, name, scale in (('il', 'Insertion Loss dB', 1),
+                                 ('rl', 'Return Loss dB', 1),
+                                 ('bwdb', 'Bandwidth 3dB MHz', 1e6)):
+            m = x[key]
+            spec = '' if m['spec'] is None else '{:11.3f}'.format(m['spec'] / scale)
+            passed = '' if m['pass'] is None else '{:6.1%}'.format(m['pass'])
+            print('  {:24s} {:11.3f} {:11.3f} {:11.3f} {:>11s} {:>7s}'.format(
+                  name, m['mean'] / scale, m['std'] / scale, m['worst'] / scale,
+                  spec, passed))
+        if x['yield'] is not None:
+            print('  Yield                    {:15.1%}'.format(x['yield']))
+
+    if 'validate' in r:
+        x = r['validate']
+        print('Validation')
+        print('  QU{}={:14.6f}'.format(1, x['QU1']))
+        print('  QU{}={:14.6f}'.format(N, x['QU2']))
+        print('  QE{}={:14.6f}'.format(1, x['QE1']))
+        print('  QE{}={:14.6f}'.format(N, x['QE2']))
+        print('  K12={:14.6f}'.format(x['K12']))
+        print('  K{}{}={:14.6f}'.format(N-1, N, x['K21']))
+
+
+# print the results of analyze_qu_sweep as a table or as CSV, the
+# Ness columns TDp_n and RLp_n are for n resonators from port p
+def report_qu_sweep(r, args):
+    N = r['N']
+    header = [ 'QU', 'IL(dB)', 'RL(dB)', 'TD(ns)' ]
+    columns = [ r['qu'], r['il'], r['rl'], r['td'] * 1e9 ]
+    for p in 1, 2:
+        for n in range(N):
+            header += [ 'TD{}_{}(ns)'.format(p, n+1), 'RL{}_{}(dB)'.format(p, n+1) ]
+            columns += [ r['TD{}'.format(p)][n] * 1e9, 
+                         db(1 / r['MA{}'.format(p)][n]) ]
+    rows = np.array(columns).T
+
+    if args.csv:
+        writer = csv.writer(sys.stdout)
+        writer.writerow([ 'name', 'N', 'qo' ] + header)
+        for row in rows:
+            writer.writerow([ r['name'], N, r.get('qo', '') ] + 
+                            [ '{:.6g}'.format(x) for x in row ])
+        return
+
+    print('---------------------------------------')
+    print('{:^39}'.format('{} Pole {}'.format(N, r['name'])))
+    print('---------------------------------------')
+    if r.get('qo'):
+        print('Predistored q0      = {:>15}'.format(str(r['qo'])))
+    print(' '.join([ '{:>12}'.format(x) for x in header ]))
+    for row in rows:
+        print(' '.join([ '{:12.3f}'.format(x) for x in row ]))
+
+
+# write the S-parameters of a filter from select_filters to a
+# touchstone file over args.sweep, by default fo +/- 2 bw
+def export(d, args, filename):
+    bw = args.bandwidth
+    fo = args.frequency
+    qu = args.qu
+    if not (bw and fo):
+        raise ValueError('Center frequency and bandwidth not set.')
+    sweep = args.sweep or (fo - 2 * bw, fo + 2 * bw, 1001)
+    comments = [
+        'rftune {} {} pole filter'.format(d['name'], len(d['g']) - 2),
+        'fo = {:g} Hz, bw = {:g} Hz, QU = {:g}'.format(fo, bw, qu),
+    ]
+    touchstone.write(filename, d['qk'], bw, fo, qu, sweep,
+                     re=args.zo / args.re, zo=args.zo, comments=comments)
+    return { 'name': d['name'], 'touchstone': filename, 'points': sweep[2] }
+
+
+# the touchstone file names for count filters, numbered when several
+def touchstone_names(filename, count):
+    root, ext = os.path.splitext(filename)
+    if ext.lower() not in ('.s1p', '.s2p'):
+        raise ValueError('Touchstone file must end in .s1p or .s2p.')
+    if count == 1:
+        return [ filename ]
+    return [ '{}-{}{}'.format(root, i + 1, ext) for i in range(count) ]
+
+
+# print the output of rftune for args, returning the results;
+# the tables, index and transfer functions stay loaded between calls
+def run(args):
+    if args.list:
+        names = list(select_table(args))
+        for name in names:
+            print(name)
+        return names
+    if args.search:
+        res = search.search(args)
+        search.report(res, args)
+        return res
+    data = select_filters(args)
+    results = []
+    if args.touchstone:
+        for d, filename in zip(data, touchstone_names(args.touchstone, len(data))):
+            results.append(export(d, args, filename))
+            print('{}: {} points'.format(filename, results[-1]['points']))
+        return results
+    for count, d in enumerate(data):
+        if args.qu_sweep is not None:
+            r = analyze_qu_sweep(d, args)
+            if count and not args.csv: print()
+            report_qu_sweep(r, args)
+        else:
+            r = analyze(d, args)
+            if count: print()
+            report(r, args)
+        results.append(r)
+    return results
+
+
+#######################
+# batch
+#######################
+
+# convert results to plain json types, with the non-finite floats,
+# such as the default qu of inf, as null
+def to_json(x):
+    if isinstance(x, dict):
+        return { k: to_json(v) for k, v in x.items() }
+    if isinstance(x, np.ndarray):
+        x = x.tolist()
+    if isinstance(x, (list, tuple)):
+        return [ to_json(v) for v in x ]
+    if isinstance(x, np.generic):
+        x = x.item()
+    if isinstance(x, float) and not math.isfinite(x):
+        return None
+    return x
+
+
+# open a JSONL or CSV file of jobs, returning its records: the rows of
+# a CSV file, or the lines of a JSONL file, parsed by batch_job
+def read_jobs(filename):
+    f = sys.stdin if filename == '-' else open(filename, newline='')
+    def records():
+        with f:
+            if filename.lower().endswith('.csv'):
+                yield from csv.DictReader(f)
+            else:
+                for line in f:
+                    if line.strip():
+                        yield line
+    return records()
+
+
+# convert a job value x to the type of action, as argparse would
+def job_value(action, x):
+    if not isinstance(x, str):
+        if isinstance(x, (bool, list, dict)):
+            raise ValueError('expected a number or a string')
+        x = str(x)
+    x = action.type(x) if action.type else x
+    if action.choices is not None and x not in action.choices:
+        raise ValueError('expected one of {}'.format(', '.join(map(str, action.choices))))
+    return x
+
+
+# return the namespace for a job record, whose keys are the long
+# option names; options given on the command line act as defaults.
+# Every value goes through the type of its option, and null or
+# empty values leave the default.
+def job_args(record, base):
+    actions = { a.dest: a for a in make_parser()._actions }
+    args = argparse.Namespace(**vars(base))
+    for key, value in record.items():
+        dest = key.lstrip('-').replace('-', '_')
+        action = actions.get(dest)
+        if action is None or dest in ('help', 'batch', 'cache', 'jobs', 'profile',
+                                      'command', 'socket', 'local', 'stream',
+                                      'measured', 'measured2', 'aperture'):
+            raise ValueError('Unknown job field {}.'.format(key))
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            continue
+        try:
+            if action.nargs == 0:
+                if not isinstance(value, bool):
+                    value = str(value).lower() in ('1', 'true', 'yes', 'y')
+            elif action.nargs:
+                items = value.split() if isinstance(value, str) else value
+                if not isinstance(items, list):
+                    items = [ items ]
+                value = [ job_value(action, x) for x in items ]
+            else:
+                value = job_value(action, value)
+        except (argparse.ArgumentTypeError, TypeError, ValueError) as e:
+            raise ValueError('{}: {}'.format(key, e))
+        setattr(args, dest, value)
+    return args
+
+
+# run one job, returning its results
+def run_job(args):
+    if args.qequ or args.k12:
+        return reverse(args)
+    if args.list:
+        return list(select_table(args))
+    if args.search:
+        return search.search(args, jobs=1)
+    if args.qu_sweep is not None:
+        return [ analyze_qu_sweep(d, args) for d in select_filters(args) ]
+    return [ analyze(d, args) for d in select_filters(args) ]
+
+
+# run job i of a batch, returning its results as a JSON line
+def batch_job(i, record, base):
+    res = { 'job': i, 'input': record.strip() if isinstance(record, str) else record }
+    try:
+        if isinstance(record, str):
+            res['input'] = record = json.loads(record)
+        if not isinstance(record, dict):
+            raise ValueError('Job is not a JSON object.')
+        res['results'] = run_job(job_args(record, base))
+    except ValueError as e:
+        res['error'] = str(e)
+    except Exception as e:
+        res['error'] = '{}: {}'.format(type(e).__name__, e)
+    return json.dumps(to_json(res), allow_nan=False)
+
+
+# load the persistent cache once in each worker process, without
+# saving it on exit, which pool workers never reach
+def init_worker(filename):
+    try:
+        cache.load(filename)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+
+# run job i of a batch in a worker process, returning its JSON line
+# and the cache entries it built, for the parent to save
+def worker_job(i, record, base):
+    keys = set(cache.entries())
+    return batch_job(i, record, base), cache.entries(keys)
+
+
+# run the batch jobs, sharded over a pool of worker processes when
+# args.jobs is not 1, writing the results in input order; with
+# --cache the entries built by the workers are merged into the cache
+# of this process, which saves them on exit
+def batch(args):
+    jobs = args.jobs or os.cpu_count()
+    try:
+        records = read_jobs(args.batch)
+    except OSError as e:
+        print(json.dumps({ 'error': str(e) }), flush=True)
+        return
+    if jobs == 1:
+        lines = map(batch_job, itertools.count(), records, itertools.repeat(args))
+        for line in lines:
+            print(line, flush=True)
+        return
+    if not args.cache:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            lines = executor.map(batch_job, itertools.count(), records,
+                                 itertools.repeat(args))
+            for line in lines:
+                print(line, flush=True)
+        return
+    with concurrent.futures.ProcessPoolExecutor(
+            jobs, initializer=init_worker, initargs=(args.cache,)) as executor:
+        res = executor.map(worker_job, itertools.count(), records,
+                           itertools.repeat(args))
+        for line, entries in res:
+            print(line, flush=True)
+            cache.merge(entries)
@@ -0,0 +1,17 @@
+#!/bin/sh
+# build the rftune executable, a python zipapp of the modules, the
+# precompiled coefficient store tables.npz with the synthesized
+# prototypes of up to 20 poles, and the Ness group delay
+# templates of filters up to 20 poles, so that rftune needs sympy
+# only for larger filters, after checking the numpy evaluators
+# against their sympy references
+set -e
+python3 tables.py 20
+python3 -c 'import ness; [ ness.groupdelay_template(n) for n in range(1, 21) ]'
+python3 res/crosscheck.py
+rm -rf build
+mkdir build
+cp __main__.py options.py reverse.py analysis.py server.py tuning.py build
+cp ness.py symbolic.py tables.py index.py instrument.py touchstone.py montecarlo.py search.py tables.npz templates.pickle build
+python3 -m zipapp build -p /usr/bin/python3 -o rftune
+rm -rf build
@@ -0,0 +1,194 @@
+# an index of the coefficient tables, built once per table on first
+# use.  Rows are keyed on (family, parameter, N, q0): the family is the
+# lowercased filter name without its parameter, such as 'chebyshev'
+# or 'linear phase', the parameter is the ripple, phase error or
+# attenuation in the name or None, and q0 is the predistortion of a
+# ZVEREV row or inf.  Besides exact lookups the index answers range
+# queries over the parameter, nearest q0 queries and interpolations at
+# any q0 between the tabled ones.
+#
+# Zverev tables the predistorted designs at q0s evenly spaced in
+# 1 / q0, and at higher orders gives several design branches per q0.
+# Branches end and new ones start as q0 falls, so they are followed
+# from q0 to q0 by the nearest rows, and each is interpolated by a
+# natural cubic spline over x = 1 / q0, built once per family and pole
+# count.  The lossless rows at q0 = inf are not the limit of the
+# branches, so they are left out.
+
+# the largest log ratio of the coefficients of consecutive rows of a
+# branch; a row further from every branch starts a new one
+BRANCH_STEP = 0.3
+
+# the q0s of the table have three decimals, so a q0 within half of
+# the last one picks the tabled rows
+Q0_DIGITS = 5e-4
+
+import numpy as np
+import re
+
+import tables
+
+indexes = {}
+
+
+# split a table key such as 'Chebyshev 0.1 dB' into ('chebyshev', 0.1)
+def split_key(key):
+    m = re.search(r'[\d\.]+', key)
+    family = key[:m.start()] if m else key
+    return family.strip().lower(), float(m.group(0)) if m else None
+
+
+class Index:
+    def __init__(self, name):
+        self.name = name
+        self.keys = {}      # (family, parameter) -> table key
+        self.rows = {}      # (family, parameter, N, q0) -> [ row, ... ]
+        self.groups = {}    # (family, N) -> [ (parameter, q0, key, row), ... ]
+        for key, rows in tables.load(name).items():
+            family, parameter = split_key(key)
+            self.keys[family, parameter] = key
+            for row in rows:
+                n, q0 = tables.row_poles(name, row)
+                self.rows.setdefault((family, parameter, n, q0), []).append(row)
+                self.groups.setdefault((family, n), []).append((parameter, q0, key, row))
+        self.splines = {}   # (family, parameter, N) -> [ (x, y, m), ... ]
+        # the parameters and q0s of every group as arrays for the queries
+        self.arrays = {}
+        for k, entries in self.groups.items():
+            parameter = np.array([ np.nan if p is None else p for p, *_ in entries ])
+            q0 = np.array([ q for _, q, *_ in entries ])
+            self.arrays[k] = parameter, q0
+
+    # the table key of a family and parameter, or None
+    def find(self, family, parameter=None):
+        return self.keys.get((family.lower(), parameter))
+
+    # the rows of a family and parameter with N poles, of all
+    # predistortions unless q0 is given
+    def lookup(self, family, parameter, n, q0=None):
+        family = family.lower()
+        if q0 is not None:
+            return list(self.rows.get((family, parameter, n, q0), []))
+        return [ row for p, q, key, row in self.groups.get((family, n), [])
+                 if p == parameter ]
+
+    # the (key, row) pairs of a family with N poles whose parameter
+    # is between lo and hi, such as the Chebyshevs of at most 0.1 dB
+    def range(self, family, n, lo=-np.inf, hi=np.inf):
+        k = (family.lower(), n)
+        if k not in self.groups:
+            return []
+        parameter, q0 = self.arrays[k]
+        match = ((parameter >= lo) & (parameter <= hi)).nonzero()[0]
+        return [ self.groups[k][i][2:] for i in match ]
+
+    # the (key, row) pair of a family and parameter with N poles whose
+    # predistortion q0 is nearest to the given q0, or None
+    def nearest(self, family, parameter, n, q0):
+        k = (family.lower(), n)
+        if k not in self.groups:
+            return None
+        p, q = self.arrays[k]
+        match = (p == parameter) if parameter is not None else np.isnan(p)
+        if not match.any():
+            return None
+        i = np.where(match, abs(q - q0), np.inf).argmin()
+        return self.groups[k][i][2:]
+
+    # the splines of each branch of the finite q0 rows of a family and
+    # parameter with N poles
+    def branches(self, family, parameter, n):
+        k = (family.lower(), parameter, n)
+        if k not in self.splines:
+            self.splines[k] = []
+            for points in self.follow(*k):
+                if len(points) < 2:
+                    continue
+                x = np.array([ p[0] for p in points ])
+                y = np.array([ p[1] for p in points ])
+                self.splines[k].append((x, y, spline(x, y)))
+        return self.splines[k]
+
+    # the branches, lists of (1 / q0, row) by falling q0, of a family
+    # and parameter with N poles; the rows of each q0 continue the
+    # branches of the previous q0 they are nearest to, closest first
+    def follow(self, family, parameter, n):
+        branches, live = [], []
+        for q0, rows in sorted(self.rows_by_q0(family, parameter, n),
+                               key=lambda item: -item[0]):
+            x = 1 / q0
+            pairs = sorted((abs(np.log(np.divide(row[2:], b[-1][1][2:]))).max(), i, j)
+                           for i, row in enumerate(rows) for j, b in enumerate(live))
+            rest, ends, grown = set(range(len(rows))), set(range(len(live))), []
+            for step, i, j in pairs:
+                if step <= BRANCH_STEP and i in rest and j in ends:
+                    live[j].append((x, rows[i]))
+                    grown.append(live[j])
+                    rest.remove(i)
+                    ends.remove(j)
+            for i in sorted(rest):
+                grown.append([ (x, rows[i]) ])
+                branches.append(grown[-1])
+            live = grown
+        return branches
+
+    # the finite q0s of a family and parameter with N poles with their
+    # rows, in table order.  The rows of a q0 follow each other with the
+    # same insertion loss, which also gathers a row with a mistyped q0.
+    def rows_by_q0(self, family, parameter, n):
+        res = []
+        for p, q0, key, row in self.groups.get((family, n), []):
+            if p != parameter or not np.isfinite(q0):
+                continue
+            if res and (res[-1][0] == q0 or res[-1][1][0][1] == row[1]):
+                res[-1][1].append(row)
+            else:
+                res.append((q0, [ row ]))
+        return res
+
+    # the (key, row) pairs of a family and parameter with N poles
+    # interpolated at q0, one for each branch whose q0s span it.  At a
+    # tabled q0 the tabled rows are returned as they are, which also
+    # reaches the designs of a single row that no spline covers.
+    def interpolate(self, family, parameter, n, q0):
+        key = self.find(family, parameter)
+        for q, rows in self.rows_by_q0(family.lower(), parameter, n):
+            if abs(q - q0) <= Q0_DIGITS:
+                return [ (key, list(row)) for row in rows ]
+        res = []
+        for x, y, m in self.branches(family, parameter, n):
+            if x[0] <= 1 / q0 <= x[-1]:
+                row = splint(x, y, m, 1 / q0).tolist()
+                row[0] = q0
+                res.append((key, row))
+        return res
+
+
+# the second derivatives at the knots x of the natural cubic splines
+# through the columns of y
+def spline(x, y):
+    h = np.diff(x)
+    m = np.zeros_like(y)
+    if len(x) > 2:
+        a = (np.diag(2 * (h[:-1] + h[1:])) +
+             np.diag(h[1:-1], 1) + np.diag(h[1:-1], -1))
+        r = 6 * ((y[2:] - y[1:-1]) / h[1:,None] - (y[1:-1] - y[:-2]) / h[:-1,None])
+        m[1:-1] = np.linalg.solve(a, r)
+    return m
+
+
+# evaluate the splines with knots x, values y and second derivatives m
+# at t within the knots
+def splint(x, y, m, t):
+    i = np.clip(np.searchsorted(x, t) - 1, 0, len(x) - 2)
+    h = x[i+1] - x[i]
+    a, b = (x[i+1] - t) / h, (t - x[i]) / h
+    return (a * y[i] + b * y[i+1] +
+            ((a**3 - a) * m[i] + (b**3 - b) * m[i+1]) * h**2 / 6)
+
+
+# return the index of the named table, building it on first use
+def index(name):
+    if name not in indexes:
+        indexes[name] = Index(name)
+    return indexes[name]
@@ -0,0 +1,100 @@
+# opt-in instrumentation behind --profile.  enable() replaces the
+# functions of ness.py and the stages of analysis.py with wrappers that
+# record their wall time and call count, and counts the points at which
+# the network functions are evaluated.  Nothing is wrapped until then,
+# so instrumentation costs nothing when it is disabled.  Times and
+# evaluation counts are inclusive of the calls made from a function.
+
+import numpy as np
+import functools, json, sys, time, types
+
+import ness, analysis
+
+# the stages of main() in analysis.py
+STAGES = [ 'select_filters', 'analyze', 'analyze_qu_sweep',
+           'report', 'report_qu_sweep', 'batch_job' ]
+
+# ness.py functions too small to be worth timing
+SKIP = [ 'db', 'cache_key' ]
+
+stats = {}      # name -> [ calls, seconds, evaluations ]
+active = []     # stats of the wrapped functions being called
+evaluations = [ 0 ]
+started = None
+
+
+# return fn wrapped to record its calls under name
+def record(name, fn):
+    entry = stats.setdefault(name, [ 0, 0.0, 0 ])
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        active.append(entry)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+            active.pop()
+    return wrapper
+
+
+# return the network function s(w, qu) counting its evaluations
+def count(s):
+    def counted(w, qu):
+        n = np.broadcast(getattr(w, 'value', w), qu).size
+        evaluations[0] += n
+        for entry in active:
+            entry[2] += n
+        return s(w, qu)
+    return counted
+
+
+# replace the functions of module by their wrappers, here and
+# wherever analysis.py imported them by name
+def patch(module, names):
+    for name in names:
+        fn = getattr(module, name)
+        wrapper = record('{}.{}'.format(module.__name__, name), fn)
+        setattr(module, name, wrapper)
+        for key, value in vars(analysis).items():
+            if value is fn:
+                setattr(analysis, key, wrapper)
+
+
+def enable():
+    global started
+    if started is not None:
+        return
+    patch(ness, [ name for name, value in vars(ness).items()
+                  if isinstance(value, types.FunctionType)
+                  and value.__module__ == 'ness' and name not in SKIP ])
+    patch(analysis, STAGES)
+    network = ness.network
+    ness.network = lambda s: network(count(s))
+    started = time.perf_counter()
+
+
+# return the recorded statistics as a dict
+def results():
+    wall = time.perf_counter() - started if started is not None else 0.0
+    functions = { name: { 'calls': calls, 'seconds': seconds, 'evaluations': evals }
+                  for name, (calls, seconds, evals) in stats.items() if calls }
+    return { 'wall': wall, 'evaluations': evaluations[0], 'functions': functions }
+
+
+# print the recorded statistics as a table or as json
+def summary(fmt='table', file=sys.stderr):
+    r = results()
+    if fmt == 'json':
+        print(json.dumps(r, indent=1), file=file)
+        return
+    print('{:36s} {:>8s} {:>11s} {:>11s} {:>12s}'.format(
+          'function', 'calls', 'total ms', 'per call ms', 'evaluations'), file=file)
+    items = sorted(r['functions'].items(), key=lambda x: -x[1]['seconds'])
+    for name, s in items:
+        print('{:36s} {:8d} {:11.3f} {:11.4f} {:12d}'.format(
+              name, s['calls'], s['seconds'] * 1e3,
+              s['seconds'] / s['calls'] * 1e3, s['evaluations']), file=file)
+    print('{:36s} {:8s} {:11.3f} {:11s} {:12d}'.format(
+          'total', '', r['wall'] * 1e3, '', r['evaluations']), file=file)
@@ -112,34 +112,34 @@ LOWPASS = {
     [ 1,0.7575,1.4454,1.8537,1.7839,2.0327,1.3453,2.0409,1.8953,1.8122,1.5286,1 ],
     ],
     'Gaussian': [
-    [ 1.0000,0.2624,0.8167,2.2262 ],
-    [ 1.0000,0.1772,0.5302,0.9321,2.2450 ],
-    [ 1.0000,0.1312,0.3896,0.6485,0.9782,2.2533 ],
-    [ 1.0000,0.1026,0.3045,0.5004,0.7050,0.9982,2.2568 ],
-    [ 1.0000,0.0833,0.2473,0.4055,0.5606,0.7333,1.0073,2.2583 ],
-    [ 1.0000,0.0695,0.2065,0.3388,0.4658,0.5942,0.7479,1.0116,2.2590 ],
-    [ 1.0000,0.0591,0.1761,0.2892,0.3973,0.5025,0.6134,0.7556,1.0137,2.2593 ],
-    [ 1.0000,0.0512,0.1525,0.2509,0.3451,0.4353,0.5250,0.6244,0.7597,1.0147,2.2594 ],
+    [ 1.0000,0.2624,0.8167,2.2262,1.0000 ],
+    [ 1.0000,0.1772,0.5302,0.9321,2.2450,1.0000 ],
+    [ 1.0000,0.1312,0.3896,0.6485,0.9782,2.2533,1.0000 ],
+    [ 1.0000,0.1026,0.3045,0.5004,0.7050,0.9982,2.2568,1.0000 ],
+    [ 1.0000,0.0833,0.2473,0.4055,0.5606,0.7333,1.0073,2.2583,1.0000 ],
+    [ 1.0000,0.0695,0.2065,0.3388,0.4658,0.5942,0.7479,1.0116,2.2590,1.0000 ],
+    [ 1.0000,0.0591,0.1761,0.2892,0.3973,0.5025,0.6134,0.7556,1.0137,2.2593,1.0000 ],
+    [ 1.0000,0.0512,0.1525,0.2509,0.3451,0.4353,0.5250,0.6244,0.7597,1.0147,2.2594,1.0000 ],
     ],
     'Gaussian 6 dB': [
-    [ 1.0000,0.4042,0.8955,2.3380 ],
-    [ 1.0000,0.4198,0.7832,1.1598,2.1427 ],
-    [ 1.0000,0.4544,0.8457,1.0924,1.0774,2.4138 ],
-    [ 1.0000,0.5041,0.9032,1.2159,1.0433,1.4212,2.0917 ],
-    [ 1.0000,0.4918,0.9232,1.2146,1.1224,1.3154,1.1407,2.5039 ],
-    [ 1.0502,0.5031,0.9699,1.2319,1.1324,1.4262,1.0449,1.6000,1.9285 ],
-    [ 1.0000,0.4979,0.9367,1.2371,1.1589,1.3845,1.1670,1.3983,1.1422,2.5277 ],
-    [ 1.1372,0.4682,1.0839,1.1516,1.2991,1.3293,1.2748,1.4216,1.1730,1.5040,2.1225 ],
+    [ 1.0000,0.4042,0.8955,2.3380,1.0000 ],
+    [ 1.0000,0.4198,0.7832,1.1598,2.1427,1.0000 ],
+    [ 1.0000,0.4544,0.8457,1.0924,1.0774,2.4138,1.0000 ],
+    [ 1.0000,0.5041,0.9032,1.2159,1.0433,1.4212,2.0917,1.0000 ],
+    [ 1.0000,0.4918,0.9232,1.2146,1.1224,1.3154,1.1407,2.5039,1.0000 ],
+    [ 1.0502,0.5031,0.9699,1.2319,1.1324,1.4262,1.0449,1.6000,1.9285,1.0000 ],
+    [ 1.0000,0.4979,0.9367,1.2371,1.1589,1.3845,1.1670,1.3983,1.1422,2.5277,1.0000 ],
+    [ 1.1372,0.4682,1.0839,1.1516,1.2991,1.3293,1.2748,1.4216,1.1730,1.5040,2.1225,1.0000 ],
     ],
     'Gaussian 12 dB': [
-    [ 1.0000,0.4152,0.9050,2.3452 ],
-    [ 1.0000,0.3097,0.6545,1.0598,2.1518 ],
-    [ 1.0000,0.2909,0.5837,0.8112,0.9660,2.3745 ],
-    [ 1.0000,0.3164,0.6070,0.7962,0.7880,1.1448,2.1154 ],
-    [ 1.0000,0.3207,0.6267,0.8091,0.7753,0.9241,0.9649,2.3829 ],
-    [ 1.0000,0.3449,0.6565,0.8686,0.8028,0.9701,0.8182,1.2503,2.0612 ],
-    [ 1.0000,0.3318,0.6500,0.8467,0.8167,0.9426,0.8239,0.9857,0.9630,2.4140 ],
-    [ 1.0139,0.3500,0.6698,0.8817,0.8148,1.0183,0.7949,1.0929,0.7508,1.4303,1.8322 ],
+    [ 1.0000,0.4152,0.9050,2.3452,1.0000 ],
+    [ 1.0000,0.3097,0.6545,1.0598,2.1518,1.0000 ],
+    [ 1.0000,0.2909,0.5837,0.8112,0.9660,2.3745,1.0000 ],
+    [ 1.0000,0.3164,0.6070,0.7962,0.7880,1.1448,2.1154,1.0000 ],
+    [ 1.0000,0.3207,0.6267,0.8091,0.7753,0.9241,0.9649,2.3829,1.0000 ],
+    [ 1.0000,0.3449,0.6565,0.8686,0.8028,0.9701,0.8182,1.2503,2.0612,1.0000 ],
+    [ 1.0000,0.3318,0.6500,0.8467,0.8167,0.9426,0.8239,0.9857,0.9630,2.4140,1.0000 ],
+    [ 1.0139,0.3500,0.6698,0.8817,0.8148,1.0183,0.7949,1.0929,0.7508,1.4303,1.8322,1.0000 ],
     ],
 }
 
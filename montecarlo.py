@@ -0,0 +1,111 @@
+# Monte Carlo tolerance and yield analysis of nodal filters.  The
+# resonator inductors and capacitors, the coupling capacitors, the
+# unloaded Q of each resonator and the terminations are perturbed by
+# draws from a seeded random generator, and the perturbed networks are
+# evaluated together as (samples x frequency) arrays, CHUNK samples at
+# a time so that the memory used stays bounded however many samples
+# are drawn.  Each sample is checked against the insertion loss at fo,
+# the minimum return loss and the 3dB bandwidth specs, as defined in
+# the nominal report: the loss relative to the lossless sample, so the
+# passband ripple does not count against it, and the median of the
+# ripple peaks of S11, or S11 at fo without any, on the grid.  As
+# narrowband resonators are detuned by a fraction of a percent, their
+# default L and C tolerances are those of a tuned filter.
+
+import numpy as np
+
+from ness import nodal_filter, nodal_reflection, nodal_transmission, db, STEPS
+
+CHUNK = 1024
+
+# the default tolerances in percent of each perturbed quantity
+TOLERANCES = { 'L': 0.05, 'C': 0.05, 'CK': 1.0, 'QU': 10.0, 'RE': 1.0 }
+
+
+# relative deviations of the given shape for a tolerance in percent,
+# uniform within the tolerance or normal with the tolerance as 3 sigma
+def deviations(rng, distribution, tol, shape):
+    if distribution == 'uniform':
+        return 1 + tol / 100 * rng.uniform(-1, 1, shape)
+    return 1 + tol / 300 * rng.standard_normal(shape)
+
+
+# the insertion loss at fo, the minimum return loss, the median of the
+# ripple peaks of S11 or at fo, and the 3dB bandwidth of networks with
+# components lp, cp, cs of shape (resonators, samples, 1), terminations
+# re and unloaded Q factors qr of each resonator
+def metrics(lp, cp, cs, re, qr, qu, fo, bw, steps=STEPS):
+    f = np.append(np.linspace(fo - 2 * bw, fo + 2 * bw, steps), fo)
+    w = 2 * np.pi * f
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s11 = nodal_reflection(lp, cp, cs, re, qr)(w, qu)
+        s21 = nodal_transmission(lp, cp, cs, re, qr)(w, qu)
+        lossless = nodal_transmission(lp, cp, cs, re, qr)(w[-1], np.inf)
+    il = db(lossless[:,0]) - db(s21[:,-1])
+    a = abs(s11[:,:-1])
+    peak = (a[:,1:-1] > a[:,:-2]) & (a[:,1:-1] >= a[:,2:])
+    with np.errstate(all='ignore'):
+        rl = np.nanmedian(np.where(peak, -db(a[:,1:-1]), np.nan), axis=1)
+    rl = np.where(peak.any(axis=1), rl, -db(s11[:,-1]))
+
+    # the 3dB band edges, interpolated between the grid points
+    f, ma = f[:-1], db(s21[:,:-1])
+    cut = ma.max(axis=1, keepdims=True) - 3.0103
+    above = ma >= cut
+    lo = above.argmax(axis=1)
+    hi = steps - 1 - above[:,::-1].argmax(axis=1)
+    rows = np.arange(len(ma))
+    def edge(i, j):
+        a, b = ma[rows,i], ma[rows,j]
+        return f[i] + (f[j] - f[i]) * (cut[:,0] - a) / (b - a)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        width = (edge(np.minimum(hi, steps - 2), np.minimum(hi + 1, steps - 1)) -
+                 edge(np.maximum(lo - 1, 0), lo))
+    width[(lo == 0) | (hi == steps - 1)] = np.nan    # edges beyond the grid
+    return il, rl, width
+
+
+# draw samples perturbed networks of a filter and return the metrics
+# of each sample; tolerances maps L, C, CK, QU and RE to percent
+def simulate(qk, bw, fo, qu, samples, tolerances=TOLERANCES,
+             distribution='normal', seed=0, chunk=CHUNK):
+    tol = dict(TOLERANCES, **tolerances)
+    lp, cp, cs = nodal_filter(qk, bw, fo)
+    n = len(lp)
+    rng = np.random.default_rng(seed)
+    res = [ [], [], [] ]
+    for start in range(0, samples, chunk):
+        m = min(chunk, samples - start)
+        x = [ v[:,None,None] * deviations(rng, distribution, tol[k], (len(v), m, 1))
+              for v, k in ((lp, 'L'), (cp, 'C'), (cs, 'CK')) ]
+        qr = deviations(rng, distribution, tol['QU'], (n, m, 1))
+        re = deviations(rng, distribution, tol['RE'], (m, 1))
+        for r, y in zip(res, metrics(*x, re, qr, qu, fo, bw)):
+            r.append(y)
+    il, rl, width = [ np.concatenate(r) for r in res ]
+    return { 'il': il, 'rl': rl, 'bwdb': width }
+
+
+# summarize the metrics of simulate against the specs, the maximum
+# insertion loss, the minimum return loss and the minimum bandwidth,
+# any of which may be None
+def yield_analysis(qk, bw, fo, qu, samples, tolerances=TOLERANCES,
+                   distribution='normal', seed=0, il=None, rl=None, bwdb=None):
+    x = simulate(qk, bw, fo, qu, samples, tolerances, distribution, seed)
+    specs = { 'il': il, 'rl': rl, 'bwdb': bwdb }
+    ok = np.ones(samples, dtype=bool)
+    res = { 'samples': samples, 'distribution': distribution, 'seed': seed,
+            'tolerances': dict(TOLERANCES, **tolerances) }
+    for key, values in x.items():
+        spec = specs[key]
+        passed = None
+        if spec is not None:
+            passed = values <= spec if key == 'il' else values >= spec
+            ok &= passed
+        res[key] = {
+            'mean': np.nanmean(values), 'std': np.nanstd(values),
+            'worst': np.nanmax(values) if key == 'il' else np.nanmin(values),
+            'spec': spec, 'pass': None if passed is None else passed.mean(),
+        }
+    res['yield'] = ok.mean() if any(v is not None for v in specs.values()) else None
+    return res
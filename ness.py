@@ -1,6 +1,6 @@
 
 import numpy as np
-import sympy as sy
+import collections, atexit, math, os, pickle, pkgutil, tempfile, threading
 
 
 # cohn approximation of insertion loss
@@ -14,29 +14,28 @@ def insertion_loss(g, bw, fo, qu):
 # return function fn(f, qu) which calculates the S11 group delay at f
 # for lossy bandpass filters shorted at resonator n
 def fn_groupdelay_tdqu(g, bw, fo, n):
-    f, w, wo, dw, wp, qu = sy.symbols("f w wo dw wp qu")
-    xin = lowpass_xin(g, wp, n)
-    WP = wo / dw * (w / wo - wo / w) - wo * sy.I / (qu * dw)
-    phi = -2 * sy.atan(xin / g[0])
-    GD = -sy.diff(WP, w) * sy.simplify(sy.diff(phi, wp)).subs(wp, WP)
-    GD = GD.subs(dw, 2 * sy.pi * bw)  # sy.pi required
-    GD = GD.subs(wo, 2 * np.pi * fo)  # np.pi required
-    GD = GD.subs(w, 2 * np.pi * f)
-    return sy.lambdify([ f, qu ], abs(GD), 'numpy')
+    wo = 2 * np.pi * fo
+    dw = 2 * np.pi * bw
+    dphi = groupdelay_template(n)
+    def fn(f, qu):
+        w = 2 * np.pi * np.asarray(f, dtype=float)
+        WP = wo / dw * (w / wo - wo / w) - wo * 1j / (qu * dw)
+        dWP = wo / dw * (1 / wo + wo / w**2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return abs(-dWP * dphi(*g[:n+1], WP))
+    return fn
 
 
 # return function fn(f, qu) which calculates the Ness S11 values
 # for lossy bandpass filters shorted at resonator n
 def fn_groupdelay_maqu(g, bw, fo, n):
-    f, w, wo, dw, wp, qu = sy.symbols("f w wo dw wp qu")
-    xin = lowpass_xin(g, wp, n)
-    WP = wo / dw * (w / wo - wo / w) - wo * sy.I / (qu * dw)
-    xin = xin.subs(wp, WP)
-    s11 = (xin * sy.I - g[0]) / (xin * sy.I + g[0])
-    s11 = s11.subs(wo, 2 * sy.pi * fo)
-    s11 = s11.subs(dw, 2 * sy.pi * bw)
-    s11 = s11.subs(w, 2 * np.pi * f)
-    return sy.lambdify([ f, qu ], s11, 'numpy')
+    wo = 2 * np.pi * fo
+    dw = 2 * np.pi * bw
+    def s11(w, qu):
+        wp = wo / dw * (w / wo - wo / w) - wo * 1j / (qu * dw)
+        xin = lowpass_xin(g, wp, n)
+        return (xin * 1j - g[0]) / (xin * 1j + g[0])
+    return network(s11)
 
 
 #######################
@@ -48,9 +47,90 @@ def db(x):
         return 20 * np.log10(abs(x))
 
 
-# calculate group delay at f using fn(f,qu)
+class Dual:
+    """
+    Dual number value + deriv * e with e**2 = 0, for forward-mode
+    differentiation of the ladder recursions.  The derivative may
+    carry extra leading axes, one per seed direction, which
+    broadcast against the value.
+    """
+    __array_ufunc__ = None  # keep numpy from wrapping duals in arrays
+
+    def __init__(self, value, deriv=0):
+        self.value = value
+        self.deriv = deriv
+
+    def __neg__(self):
+        return Dual(-self.value, -self.deriv)
+
+    def __add__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value + other.value, self.deriv + other.deriv)
+        return Dual(self.value + other, self.deriv)
+
+    def __sub__(self, other):
+        return self + -other
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __mul__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value * other.value,
+                        self.deriv * other.value + self.value * other.deriv)
+        return Dual(self.value * other, self.deriv * other)
+
+    def __truediv__(self, other):
+        if isinstance(other, Dual):
+            return Dual(self.value / other.value,
+                        (self.deriv * other.value - self.value * other.deriv) /
+                        (other.value * other.value))
+        return Dual(self.value / other, self.deriv / other)
+
+    def __rtruediv__(self, other):
+        return Dual(other / self.value,
+                    -other * self.deriv / (self.value * self.value))
+
+    def __pow__(self, p):
+        return Dual(self.value**p, p * self.value**(p - 1) * self.deriv)
+
+    def __abs__(self):
+        return Dual(abs(self.value),
+                    np.real(np.conj(self.value) * self.deriv) / abs(self.value))
+
+    @property
+    def real(self):
+        return Dual(np.real(self.value), np.real(self.deriv))
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+
+# return function fn(f, qu) evaluating the network function s(w, qu)
+# at the frequency f, with f and qu broadcast as numpy arrays;
+# fn.dw(f, qu) returns both S and dS/dw by forward differentiation
+def network(s):
+    def fn(f, qu):
+        w = 2 * np.pi * np.asarray(f, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return s(w, qu)
+    def dw(f, qu):
+        w = 2 * np.pi * np.asarray(f, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = s(Dual(w, 1.0), qu)
+        return x.value, x.deriv
+    fn.dw = dw
+    return fn
+
+
+# calculate group delay at f using fn(f,qu), analytically from
+# dS/dw when fn provides it, else by a finite difference
 # (used by nodal_delay_transmission and nodal_delay_bandwidth)
 def groupdelay(fn, f, qu):
+    if hasattr(fn, 'dw'):
+        s, ds = fn.dw(f, qu)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return -np.imag(ds / s)
     df = 1
     a = np.angle(fn(f - df / 2, qu))
     b = np.angle(fn(f + df / 2, qu))
@@ -59,6 +139,173 @@ def groupdelay(fn, f, qu):
     return td[0] if np.isscalar(f) else td
 
 
+#######################
+# cache
+#######################
+
+CACHE_SIZE = 256
+CACHE_DIGITS = 10
+
+
+# hashable form of the arguments with every float rounded to
+# CACHE_DIGITS significant digits, so filters equal to within
+# that tolerance share a cache entry
+def cache_key(*args):
+    def r(x): return float('{:.{}g}'.format(x, CACHE_DIGITS))
+    return tuple(tuple(r(x) for x in np.ravel(v)) if np.ndim(v) else r(v)
+                 for v in args)
+
+
+class FunctionCache:
+    """
+    Bounded LRU cache of the transfer functions fn(f, qu).  Each
+    entry is built by the network function named by the first
+    element of its key from a picklable tuple of arguments, so the
+    cache can be persisted to disk and reloaded across processes.
+    """
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.filename = None
+        self.hits = 0
+        self.misses = 0
+        self.data = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, build):
+        with self.lock:
+            if key in self.data:
+                self.hits += 1
+                self.data.move_to_end(key)
+                return self.data[key][1]
+            self.misses += 1
+        return self.put(key, build())
+
+    def put(self, key, args):
+        fn = network(BUILDERS[key[0]](*args))
+        with self.lock:
+            self.data[key] = args, fn
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return fn
+
+    # the arguments of the entries, or only of those not in keys
+    def entries(self, keys=()):
+        with self.lock:
+            return { key: args for key, (args, fn) in self.data.items()
+                     if key not in keys }
+
+    # add the entries of another cache that this one lacks
+    def merge(self, entries):
+        for key, args in entries.items():
+            if key[0] in BUILDERS and key not in self.data:
+                self.put(key, args)
+
+    def info(self):
+        return { 'hits': self.hits, 'misses': self.misses,
+                 'size': len(self.data), 'maxsize': self.maxsize }
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = 0
+
+    def load(self, filename):
+        with open(filename, 'rb') as f:
+            self.merge(pickle.load(f))
+
+    def save(self, filename=None):
+        filename = filename or self.filename
+        entries = self.entries()
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(entries, f)
+        os.replace(tmp, filename)
+
+    # opt-in persistence: load filename if it exists
+    # and save the cache back to it on exit
+    def persist(self, filename):
+        try:
+            self.load(filename)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        if self.filename is None:
+            atexit.register(self.save)
+        self.filename = filename
+
+
+cache = FunctionCache()
+
+
+#######################
+# searches
+#######################
+
+# frequency sweeps locate band edges and peaks on a coarse grid
+# of STEPS points, then refine them to TOLERANCE times the span
+STEPS = 500
+TOLERANCE = 1e-8
+GOLDEN = (3 - np.sqrt(5)) / 2
+
+
+# golden-section search for the maximum of fn(x) in [a, b],
+# returns x and fn(x); a and b may be arrays of brackets of equal
+# width which are searched together
+def golden(fn, a, b, tol):
+    c = a + GOLDEN * (b - a)
+    d = b - GOLDEN * (b - a)
+    fc, fd = fn(c), fn(d)
+    while np.any(abs(b - a) > tol):
+        m = fc > fd
+        a = np.where(m, a, c)
+        b = np.where(m, d, b)
+        x = np.where(m, a + GOLDEN * (b - a), b - GOLDEN * (b - a))
+        fx = fn(x)
+        c, d, fc, fd = (np.where(m, x, d), np.where(m, c, x),
+                        np.where(m, fx, fd), np.where(m, fc, fx))
+    m = fc > fd
+    return np.where(m, c, d)[()], np.where(m, fc, fd)[()]
+
+
+# refine the maximum (sign=1) or minimum (sign=-1) of fn found
+# at the grid point f[i] using its two neighbours as a bracket
+def refine_peak(fn, f, i, tol, sign=1):
+    a = f[max(i - 1, 0)]
+    b = f[min(i + 1, len(f) - 1)]
+    x, y = golden(lambda x: sign * fn(x), a, b, tol)
+    return x, sign * y
+
+
+# find the root of fn(x) bracketed by [a, b] using the
+# Illinois variant of regula falsi
+def findroot(fn, a, b, tol, maxiter=100):
+    fa, fb = fn(a), fn(b)
+    for _ in range(maxiter):
+        if abs(b - a) <= tol or fb == 0:
+            break
+        c = b - fb * (b - a) / (fb - fa)
+        fc = fn(c)
+        if fc * fb < 0:
+            a, fa = b, fb
+        else:
+            fa /= 2
+        b, fb = c, fc
+    return b
+
+
+# find the roots of fn(x) with the secant method from the starting
+# points x0 and x1, which may be arrays of points solved together
+def secant(fn, x0, x1, tol, maxiter=50):
+    f0, f1 = fn(x0), fn(x1)
+    for _ in range(maxiter):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = np.where(f1 != f0, x1 - f1 * (x1 - x0) / (f1 - f0), x1)
+        if not np.any(abs(x - x1) > tol * abs(x)):
+            return x
+        x0, f0, x1, f1 = x1, f1, x, fn(x)
+    return x1
+
+
 # denormalize qk coefficients
 def denormalize_qk(qk, bw, fo):
     ql = fo / bw
@@ -69,13 +316,11 @@ def denormalize_qk(qk, bw, fo):
 
 # calculate lowpass prototype g values from qk coefficients
 def prototype_qk(qk, g0=1):
-    g = np.zeros(len(qk)+1)
-    g[0] = g0
-    g[1] = qk[0] / g[0]
-    for i in range(1, len(g)-2):
-        g[i+1] = 1 / (qk[i]**2 * g[i])
-    g[-1] = qk[-1] / g[-2]
-    return g
+    g = [ g0, qk[0] / g0 ]
+    for i in range(1, len(qk)-1):
+        g.append(1 / (qk[i]**2 * g[-1]))
+    g.append(qk[-1] / g[-1])
+    return np.array(g)
 
 
 # calculate qk coefficients from lowpass prototype g values
@@ -106,72 +351,164 @@ def chebyshev(n, ripple):
     return g
 
 
+#######################
+# synthesis
+#######################
+
+# the prototypes of the all-pole families besides the Chebyshev are
+# synthesized from their characteristic function K, a numpy series
+# in y = w^2 with |S21|^2 = 1 / (1 + K(y)), and normalized like the
+# LOWPASS tables to 3 dB at w = 1 with equal terminations
+
+
+# calculate the lowpass prototype g values from the characteristic
+# function k by Darlington synthesis: S21 = 1 / P(s), S11 = F(s) / P(s)
+# and the ladder is the continued fraction of (P + F) / (P - F).  Each
+# root y of K or 1 + K gives the root s = +/-sqrt(-y) of F or P.
+def synthesize_g(k):
+    from numpy.polynomial import Polynomial
+    n = k.degree()
+    lead = np.sqrt(abs(k.convert(kind=Polynomial).coef[-1]))
+    f = np.real(np.poly(np.sqrt(-k.roots() + 0j))) * lead
+    p = np.real(np.poly(-np.sqrt(-(k + 1).roots() + 0j))) * lead
+    num, den = p + f, (p - f)[1:]
+    g = [ 1 ]
+    for i in range(n):
+        q = num[0] / den[0]
+        r = num - q * np.append(den, 0)
+        num, den = den, r[2:] if i < n - 1 else r[1:]
+        g.append(q)
+    g.append(num[0] / den[0])
+    return np.array(g)
+
+
+# scale the characteristic function k, a Polynomial, for 3 dB at w = 1
+def normalize_k(k):
+    r = (k - 1).roots()
+    y = min(x.real for x in r if abs(x.imag) <= 1e-9 * abs(x) and x.real > 0)
+    return k.__class__(k.coef * y**np.arange(len(k.coef)))
+
+
+def butterworth(n):
+    g = np.ones(n + 2)
+    g[1:-1] = 2 * np.sin((2 * np.arange(1, n + 1) - 1) * np.pi / (2 * n))
+    return g
+
+
+# maximally flat delay, from the reverse Bessel polynomial
+def bessel(n):
+    from numpy.polynomial import Polynomial
+    f = [ math.factorial(i) for i in range(2 * n + 1) ]
+    p = np.array([ f[2*n-i] / (2**(n-i) * f[i] * f[n-i]) for i in range(n + 1) ])
+    p = p / p[0] * 1j**np.arange(n + 1)     # P(jw) / P(0)
+    k = np.convolve(p, np.conj(p)).real[::2]
+    k[0] = 0
+    return synthesize_g(normalize_k(Polynomial(k)))
+
+
+# the Taylor series of |S21|^-2 = exp(w^2) to order n
+def gaussian(n):
+    from numpy.polynomial import Polynomial
+    k = np.array([ 1 / math.factorial(i) for i in range(n + 1) ])
+    k[0] = 0
+    return synthesize_g(normalize_k(Polynomial(k)))
+
+
+# Papoulis' optimum L filter, the steepest monotonic response, kept
+# as a Legendre series in x = 2 w^2 - 1 for its roots to be accurate
+def legendre(n):
+    from numpy.polynomial import Legendre
+    m = (n - 1) // 2
+    i = np.arange(m + 1)
+    if n % 2:
+        a = (2 * i + 1) / (np.sqrt(2) * (m + 1))
+    else:
+        a = np.where(i % 2 == m % 2, (2 * i + 1) / np.sqrt((m + 1) * (m + 2)), 0)
+    v = Legendre(a)**2
+    if n % 2 == 0:
+        v = v * Legendre([ 1, 1 ])
+    k = v.integ(lbnd=-1)
+    return synthesize_g(Legendre(k.coef, domain=[ 0, 1 ]))
+
+
 #######################
 # nodal
 #######################
 
-# compute the components of a top-coupled nodal filter
+# compute the components of a top-coupled nodal filter; qk may be an
+# object array of duals, giving components carrying their derivatives
 def nodal_filter(qk, bw, fo):
+    qk = np.asarray(qk)
     N = len(qk) - 1
     QL = fo / bw
-    Q = np.array(qk[::N]) * QL
-    K = np.array(qk[1:-1]) / QL
+    K = qk[1:-1] / QL
 
-    # nodal resonators
+    # nodal resonators, all but the last set by Q1
     wo = 2 * np.pi * fo
     RE = 1
-    L0 = RE / (wo * Q)
-    L0 = np.concatenate((L0[0] * np.ones(N-1), L0[1:]))
+    L0 = RE / (wo * QL * qk[[0] * (N-1) + [N]])
     CM = 1 / (wo**2 * L0)
 
     # coupling capacitors
-    Z = 1 / (wo * np.sqrt(CM[:-1] * CM[1:]))
-    CK = K / (wo * Z)
-    CK = np.insert(np.zeros(2), 1, CK)
-    C0 = CM - CK[:-1] - CK[1:]
-    return L0, C0, CK[1:-1]
+    CK = K * (CM[:-1] * CM[1:])**0.5
+    C0 = CM.copy()
+    C0[:-1] -= CK
+    C0[1:] -= CK
+    return L0, C0, CK
+
+
+# return a function s11(w, qu) for the components of a nodal filter;
+# qr scales the unloaded Q of each resonator, and the components, re
+# and qr may carry trailing axes, such as Monte Carlo samples
+def nodal_reflection(lp, cp, cs, re=1, qr=None):
+    qr = np.ones(len(lp)) if qr is None else qr
+    def s11(w, qu):
+        zin = re
+        for i in reversed(range(len(lp))):
+            zin = 1 / (1j * w * cp[i] + 
+                       1 / (1j * w * lp[i]) +
+                       1 / (w * lp[i]) / (qu * qr[i]) +
+                       1 / zin
+                      )
+            if i > 0: zin += 1 / (1j * w * cs[i-1])           
+        return (zin - re) / (zin + re)
+    return s11
+
+
+# return a function s21(w, qu) for the components of a nodal filter
+def nodal_transmission(lp, cp, cs, re=1, qr=None):
+    qr = np.ones(len(lp)) if qr is None else qr
+    def s21(w, qu):
+        vin = 1
+        zin = re
+        n = len(lp) - 1
+        for i in range(n):
+            a = 1 / (1j * w * cp[i] + 
+                     1 / (1j * w * lp[i]) +
+                     1 / (w * lp[i]) / (qu * qr[i])
+                    )
+            vin = vin * a / (a + zin)
+            zin = 1 / (1 / a + 1 / zin)
+            zin += 1 / (1j * w * cs[i])
+        a = 1 / (1 / re + 
+                 1j * w * cp[n] + 
+                 1 / (1j * w * lp[n]) +
+                 1 / (w * lp[n]) / (qu * qr[n])
+                )
+        return 2 * vin * a / (zin + a)
+    return s21
 
 
 # return a function fn(f, qu) for calculating the S11 of a nodal filter
 def fn_nodal_reflection(qk, bw, fo, re=1):
-    lp, cp, cs = nodal_filter(qk, bw, fo)
-    f, w, qu = sy.symbols('f w qu')
-    zin = re
-    for i in reversed(range(len(lp))):
-        zin = 1 / (sy.I * w * cp[i] + 
-                   1 / (sy.I * w * lp[i]) +
-                   1 / (w * lp[i] * qu) +
-                   1 / zin
-                  )
-        if i > 0: zin += 1 / (sy.I * w * cs[i-1])           
-    s11 = (zin - re) / (zin + re)
-    s11 = s11.subs(w, 2 * np.pi * f)    
-    return sy.lambdify([f, qu], s11, 'numpy')
+    key = ('nodal_reflection',) + cache_key(qk, bw, fo, re)
+    return cache.get(key, lambda: nodal_filter(qk, bw, fo) + (re,))
 
 
 # return a function fn(f, qu) for calculating the S21 of a nodal filter
-def fn_nodal_transmission(qk, fo, bw, re=1):
-    lp, cp, cs = nodal_filter(qk, fo, bw)
-    f, w, qu = sy.symbols('f w qu')
-    vin = 1
-    zin = re
-    n = len(lp) - 1
-    for i in range(n):
-        a = 1 / (sy.I * w * cp[i] + 
-                 1 / (sy.I * w * lp[i]) +
-                 1 / (w * lp[i] * qu)
-                )
-        vin = vin * a / (a + zin)
-        zin = 1 / (1 / a + 1 / zin)
-        zin += 1 / (sy.I * w * cs[i])
-    a = 1 / (1 / re + 
-             sy.I * w * cp[n] + 
-             1 / (sy.I * w * lp[n]) +
-             1 / (w * lp[i] * qu)
-            )
-    s21 = 2 * vin * a / (zin + a)
-    s21 = s21.subs(w, 2 * np.pi * f)    
-    return sy.lambdify([f, qu], s21, 'numpy')
+def fn_nodal_transmission(qk, bw, fo, re=1):
+    key = ('nodal_transmission',) + cache_key(qk, bw, fo, re)
+    return cache.get(key, lambda: nodal_filter(qk, bw, fo) + (re,))
 
 
 # calculate the insertion loss of a filter at fo
@@ -188,47 +525,380 @@ def nodal_delay_transmission(qk, bw, fo, qu):
 
 ### approximations
 
-# calculate the (approximate) minimum return loss of a filter
-def nodal_returnloss(qk, bw, fo, qu, steps=10000):
-    fn = fn_nodal_reflection(qk, bw, fo)
+# calculate the (approximate) minimum return loss of a filter,
+# for a single qu or an array of them at once
+def nodal_returnloss(qk, bw, fo, qu, steps=STEPS, tol=None):
+    return returnloss(fn_nodal_reflection(qk, bw, fo), bw, fo, qu, steps, tol)
+
+
+# the minimum return loss from the ripple peaks of fn(f, qu), an S11
+def returnloss(fn, bw, fo, qu, steps=STEPS, tol=None):
+    tol = tol or bw * TOLERANCE
+    qu = np.asarray(qu, dtype=float)
+    qus = qu.ravel()
+    j, x, y = ripple_peaks(fn, bw, fo, qus, steps, tol)
+    rl = -db(fn(fo, qus))
+    for k in np.unique(j):
+        rl[k] = np.median(-y[j == k])
+    return rl.reshape(qu.shape)[()]
+
+
+# find the ripple peaks of |S11| from fn(f, qu) within fo +/- 2 bw
+# for the unloaded Qs qus, returning the index into qus, the frequency
+# and the peak in dB of each
+def ripple_peaks(fn, bw, fo, qus, steps=STEPS, tol=None):
+    tol = tol or bw * TOLERANCE
     f = np.linspace(fo - 2 * bw, fo + 2 * bw, steps)
-    ma = -db(fn(f, qu))
-    a = (np.diff(np.sign(np.diff(ma))) > 0).nonzero()[0] + 1
-    return np.median(ma[a]) if a.size else -db(fn(fo, qu))
+    ma = -db(fn(f[:,None], qus))
+    i, j = (np.diff(np.sign(np.diff(ma, axis=0)), axis=0) > 0).nonzero()
+    if not i.size:
+        return j, f[i], f[i]
+    x, y = golden(lambda x: db(fn(x, qus[j])), f[i], f[i+2], tol)
+    return j, x, y
 
 
 # approximate the group delay bandwidth of a filter
-def nodal_delay_bandwidth(qk, bw, fo, qu, steps=10000):
+def nodal_delay_bandwidth(qk, bw, fo, qu, steps=STEPS, tol=None):
+    tol = tol or bw * TOLERANCE
     fn = fn_nodal_transmission(qk, bw, fo)
     f = np.linspace(fo - 2 * bw, fo + 2 * bw, steps)
     td = groupdelay(fn, f, qu)
     a = np.diff(np.sign(np.diff(td))).nonzero()[0] + 1
-    f1 = f[a[0]]
-    f2 = f[a[-1]]
-    # from scipy.optimize import minimize
-    # res = minimize(lambda x: -groupdelay(fn, x, qu), f1, method='Nelder-Mead')
-    # f1 = res.x[0] if res.success else np.nan
-    # res = minimize(lambda x: -groupdelay(fn, x, qu), f2, method='Nelder-Mead')
-    # f2 = res.x[0] if res.success else np.nan
-    return f2 - f1
+    if not a.size:
+        return np.nan
+    fp = []
+    for i in a[0], a[-1]:
+        sign = 1 if td[i] > td[i-1] else -1
+        fp.append(refine_peak(lambda x: groupdelay(fn, x, qu), f, i, tol, sign)[0])
+    return fp[1] - fp[0]
 
 
 # approximate the 3db bandwidth of a filter
-def nodal_bandwidth(qk, bw, fo, qu, cutoff=3.0103, steps=10000):
+def nodal_bandwidth(qk, bw, fo, qu, cutoff=3.0103, steps=STEPS, tol=None):
+    edges = nodal_bandedges(qk, bw, fo, qu, cutoff, steps, tol)
+    if edges is None:
+        return np.nan
+    return edges[2] - edges[1]
+
+
+# find the peak of S21 and the band edges cutoff dB below it, returning
+# the frequencies (fmax, f1, f2), or None without edges in fo +/- 2 bw
+def nodal_bandedges(qk, bw, fo, qu, cutoff=3.0103, steps=STEPS, tol=None):
     fn = fn_nodal_transmission(qk, bw, fo)
+    return bandedges(fn, bw, fo, qu, cutoff, steps, tol)
+
+
+# the band edges (fmax, f1, f2) of fn(f, qu), an S21, or None
+def bandedges(fn, bw, fo, qu, cutoff=3.0103, steps=STEPS, tol=None):
+    tol = tol or bw * TOLERANCE
     f = np.linspace(fo - 2 * bw, fo + 2 * bw, steps)
     ma = db(fn(f, qu))
-    a = (np.diff(np.sign(np.diff(abs(np.max(ma) - ma - cutoff)))) > 0).nonzero()[0] + 1
-    f1 = f[a[0]]
-    f2 = f[a[-1]]
-    # from scipy.optimize import minimize
-    # res = minimize(lambda x: -db(fn(x, qu)), fo, method='Nelder-Mead')
-    # mamax = -res.fun if res.success else np.nan
-    # res = minimize(lambda x: abs(mamax - db(fn(x, qu)) - cutoff), f1, method='Nelder-Mead')
-    # f1 = res.x[0] if res.success else np.nan
-    # res = minimize(lambda x: abs(mamax - db(fn(x, qu)) - cutoff), f2, method='Nelder-Mead')
-    # f2 = res.x[0] if res.success else np.nan
-    return f2 - f1
+    fmax, mamax = refine_peak(lambda x: db(fn(x, qu)), f, np.argmax(ma), tol)
+    a = np.diff(np.sign(mamax - ma - cutoff)).nonzero()[0]
+    if not a.size:
+        return None
+    fn3db = lambda x: mamax - db(fn(x, qu)) - cutoff
+    f1 = findroot(fn3db, f[a[0]], f[a[0]+1], tol)
+    f2 = findroot(fn3db, f[a[-1]], f[a[-1]+1], tol)
+    return fmax, f1, f2
+
+#######################
+# coupling matrix
+#######################
+
+# the coupling matrix engine: the normalized N x N coupling matrix M,
+# with the couplings of qk beside its diagonal and any cross couplings
+# beyond, is solved at every frequency at once.  With the lowpass
+# frequency l = fo / bw (w / wo - wo / w), the port loadings R1 = 1 / q1
+# and Rn = 1 / qn and the losses fo / (bw QU) of the resonators in D,
+# A = l I - j (R + D) + M and
+#   S11 = 1 + 2j R1 [A^-1]11,  S21 = -2j sqrt(R1 Rn) [A^-1]n1
+# so one solve of A x = e1 gives both.  In-line filters are solved by
+# the Thomas algorithm, the rest by a batched np.linalg.solve, and the
+# cost is linear in the frequencies either way.  Unlike in the nodal
+# filter, the couplings do not change over the band.
+
+# return the normalized coupling matrix of qk and its port loadings
+# (R1, Rn); cross maps pairs of resonators (i, j), counted from 1,
+# to normalized cross couplings
+def coupling_matrix(qk, cross=None):
+    qk = np.asarray(qk, dtype=float)
+    N = len(qk) - 1
+    m = np.diag(qk[1:-1], 1)
+    for (i, j), k in (cross or {}).items():
+        if not (1 <= i <= N and 1 <= j <= N and abs(i - j) > 1):
+            raise ValueError('K{}{} is not a cross coupling of a {} pole filter.'
+                             .format(i, j, N))
+        m[min(i, j) - 1, max(i, j) - 1] = k
+    return m + np.triu(m, 1).T, np.array([ 1 / qk[0], 1 / qk[-1] ])
+
+
+# solve (diag(d) + m) x = b for a symmetric m, with d and b of shape
+# (..., N), by the Thomas algorithm when m is tridiagonal
+def matrix_solve(d, m, b):
+    d, b = np.broadcast_arrays(d, b)
+    if np.triu(m, 2).any():
+        a = m + d[...,None] * np.eye(len(m))
+        return np.linalg.solve(a, b[...,None])[...,0]
+    e = np.diag(m, 1)
+    c, y = [ 0 ], [ 0 ]
+    for i in range(len(m)):
+        k = e[i-1] if i else 0
+        den = d[...,i] - k * c[-1]
+        c.append(e[i] / den if i < len(e) else 0)
+        y.append((b[...,i] - k * y[-1]) / den)
+    x = [ y[-1] ]
+    for i in reversed(range(1, len(m))):
+        x.append(y[i] - c[i] * x[-1])
+    return np.stack(x[::-1], axis=-1)
+
+
+# return a function solve(w, qu) of [A^-1]11 and [A^-1]n1 for the
+# coupling matrix m with port loadings r; qr scales the unloaded Q of
+# each resonator, and a dual w gives duals by dx/dw = -A^-1 dl/dw x
+def matrix_solver(m, r, bw, fo, qr=None):
+    N = len(m)
+    qr = np.ones(N) if qr is None else np.asarray(qr, dtype=float)
+    wo = 2 * np.pi * fo
+    ports = np.zeros(N)
+    ports[0] += r[0]
+    ports[-1] += r[1]
+    e1 = np.eye(N)[0]
+    def solve(w, qu):
+        v = w.value if isinstance(w, Dual) else w
+        v = np.asarray(v)[...,None]
+        qu = np.asarray(qu, dtype=float)[...,None]
+        d = fo / bw * (v / wo - wo / v) - 1j * (ports + fo / (bw * qu * qr))
+        x = matrix_solve(d, m, e1)
+        if not isinstance(w, Dual):
+            return x[...,0], x[...,-1]
+        dx = matrix_solve(d, m, -fo / bw * (1 / wo + wo / v**2) * x)
+        return (Dual(x[...,0], dx[...,0] * w.deriv),
+                Dual(x[...,-1], dx[...,-1] * w.deriv))
+    return solve
+
+
+# return a function s11(w, qu) for a coupling matrix
+def matrix_reflection(m, r, bw, fo, qr=None):
+    solve = matrix_solver(m, r, bw, fo, qr)
+    def s11(w, qu):
+        return 1 + 2j * r[0] * solve(w, qu)[0]
+    return s11
+
+
+# return a function s21(w, qu) for a coupling matrix
+def matrix_transmission(m, r, bw, fo, qr=None):
+    solve = matrix_solver(m, r, bw, fo, qr)
+    def s21(w, qu):
+        return -2j * np.sqrt(r[0] * r[1]) * solve(w, qu)[1]
+    return s21
+
+
+# return a function fn(f, qu) for calculating the S11 of a filter
+# from its coupling matrix
+def fn_matrix_reflection(qk, bw, fo, cross=None, qr=None):
+    key = ('matrix_reflection',) + matrix_key(qk, bw, fo, cross, qr)
+    return cache.get(key, lambda: coupling_matrix(qk, cross) + (bw, fo, qr))
+
+
+# return a function fn(f, qu) for calculating the S21 of a filter
+# from its coupling matrix
+def fn_matrix_transmission(qk, bw, fo, cross=None, qr=None):
+    key = ('matrix_transmission',) + matrix_key(qk, bw, fo, cross, qr)
+    return cache.get(key, lambda: coupling_matrix(qk, cross) + (bw, fo, qr))
+
+
+# the cache key of a coupling matrix filter
+def matrix_key(qk, bw, fo, cross, qr):
+    cross = sorted((min(i, j), max(i, j), k) for (i, j), k in (cross or {}).items())
+    qr = np.ones(len(qk) - 1) if qr is None else qr
+    return cache_key(qk, bw, fo, np.ravel(cross), qr)
+
+
+# network functions that can be memoized in the cache
+BUILDERS = {
+    'nodal_reflection': nodal_reflection,
+    'nodal_transmission': nodal_transmission,
+    'matrix_reflection': matrix_reflection,
+    'matrix_transmission': matrix_transmission,
+}
+
+
+# the Ness group delays and S11 magnitudes at fo from port 1 of a
+# coupling matrix, with resonators n + 1 ... N shorted for each n
+def matrix_ness(m, r, bw, fo, qu, qr=None):
+    qr = np.ones(len(m)) if qr is None else np.asarray(qr, dtype=float)
+    td, ma = [], []
+    for n in range(1, len(m) + 1):
+        fn = network(matrix_reflection(m[:n,:n], (r[0], 0), bw, fo, qr[:n]))
+        td.append(groupdelay(fn, fo, qu))
+        ma.append(abs(fn(fo, qu)))
+    return np.array(td), np.array(ma)
+
+
+#######################
+# sensitivity
+#######################
+
+# the Jacobians of the Ness delays, their return losses and the
+# passband metrics with respect to every q and k come from one
+# evaluation with each coefficient qk[i] a dual number seeded along
+# direction i, instead of a re-analysis per perturbed coefficient.
+# One more direction, the frequency, carries the band edges along with
+# the coefficients; the ripple peaks of S11 and of S21 are stationary
+# in frequency, so moving them changes nothing to first order.
+
+
+# return qk as an object array of duals seeded along the first len(qk)
+# of size directions, with ndim trailing axes to broadcast over
+def seed_qk(qk, size, ndim=0):
+    eye = np.eye(size).reshape((size, size) + (1,) * ndim)
+    return np.array([ Dual(x, eye[i]) for i, x in enumerate(qk) ], dtype=object)
+
+
+# the dual of db(x) for a dual x
+def dual_db(x):
+    return Dual(db(x.value), 20 / np.log(10) * np.real(x.deriv / x.value))
+
+
+# the values and the Jacobian, one row per value, of a list of scalar
+# duals, keeping the first n directions
+def jacobian(x, n):
+    return (np.array([ d.value for d in x ]),
+            np.array([ np.ravel(d.deriv)[:n] for d in x ]))
+
+
+# the sensitivities of a filter to its coefficients qk: the Ness
+# delays TD1, TD2 and return losses RL1, RL2 in dB from both ports,
+# the insertion loss il, the minimum return loss rl and the 3dB
+# bandwidth bwdb, each as (value, jacobian) with one column per qk
+def nodal_sensitivity(qk, bw, fo, qu, steps=STEPS, tol=None):
+    n = len(qk)
+    x = seed_qk(qk, n + 1, 1)
+    res = {}
+    for port, q in (('1', x), ('2', x[::-1])):
+        g = prototype_qk(q)
+        if np.isinf(qu):
+            td = groupdelay_g(g, bw)
+            res['TD' + port] = jacobian(td, n)
+            res['RL' + port] = np.zeros(len(td)), np.zeros((len(td), n))
+            continue
+        res['TD' + port] = jacobian(groupdelay_tdqu(g, bw, fo, qu), n)
+        rl = [ -dual_db(ma) for ma in groupdelay_maqu(g, bw, fo, qu) ]
+        res['RL' + port] = jacobian(rl, n)
+
+    lp, cp, cs = nodal_filter(x, bw, fo)
+    s11 = network(nodal_reflection(lp, cp, cs))
+    s21 = network(nodal_transmission(lp, cp, cs))
+    il = dual_db(s21(fo, np.inf)) - dual_db(s21(fo, qu))
+    res['il'] = il.value, il.deriv[:n,0]
+
+    # the median of the ripple peaks, as nodal_returnloss
+    j, f, y = ripple_peaks(fn_nodal_reflection(qk, bw, fo), bw, fo,
+                           np.array([ qu ], dtype=float), steps, tol)
+    order = np.argsort(-y)
+    f = f[order[(len(f) - 1) // 2:len(f) // 2 + 1]] if len(f) else np.array([ fo ])
+    rl = -dual_db(s11(f, qu))
+    res['rl'] = rl.value.mean(), rl.deriv[:n].mean(axis=-1)
+
+    # the edges f1, f2 keep |S21| at cutoff below the peak at fmax, so
+    # dfi/dqk = (dS21(fmax)/dqk - dS21(fi)/dqk) / (dS21(fi)/df)
+    edges = nodal_bandedges(qk, bw, fo, qu, steps=steps, tol=tol)
+    if edges is None:
+        res['bwdb'] = np.nan, np.full(n, np.nan)
+    else:
+        f = np.array(edges)
+        w = Dual(2 * np.pi * f, np.eye(n + 1, 1, -n) * 2 * np.pi)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ma = dual_db(nodal_transmission(lp, cp, cs)(w, qu))
+        df = (ma.deriv[:n,:1] - ma.deriv[:n,1:]) / ma.deriv[n,1:]
+        res['bwdb'] = f[2] - f[1], df[:,1] - df[:,0]
+    return res
+
+
+#######################
+# time domain
+#######################
+
+# the bandpass mode time-domain response of network analyzers: S11
+# or S21 sampled over a span around fo is windowed and transformed to
+# time.  Only the times of interest are computed, by the chirp-z
+# transform, and a leading axis of S holds a batch of filters.  The
+# dips of S11 in time mark the resonators and the peaks the couplings,
+# as in Dishal's time-domain tuning.
+WINDOWS = {
+    'rect': lambda n, beta: np.ones(n),
+    'hann': lambda n, beta: np.hanning(n),
+    'hamming': lambda n, beta: np.hamming(n),
+    'blackman': lambda n, beta: np.blackman(n),
+    'kaiser': np.kaiser,
+}
+WINDOW = 'kaiser'
+BETA = 6            # the normal window of network analyzers
+TD_POINTS = 401
+
+
+# the chirp-z transform X[k] = sum x[n] a^-n w^(n k) for k < m along
+# the last axis of x, by Bluestein's algorithm with FFTs
+def czt(x, m, w, a=1):
+    n = x.shape[-1]
+    size = 1 << (n + m - 2).bit_length()
+    k = np.arange(max(m, n))
+    wk = w**(k**2 / 2)
+    y = x * a**-np.arange(n) * wk[:n]
+    v = np.zeros(size, dtype=complex)
+    v[:m] = 1 / wk[:m]
+    v[size-n+1:] = 1 / wk[1:n][::-1]
+    y = np.fft.ifft(np.fft.fft(y, size) * np.fft.fft(v))
+    return y[...,:m] * wk[:m]
+
+
+# the time-domain response at the evenly spaced times t of s[..., i]
+# sampled at the offsets (i - (points - 1) / 2) df from fo, normalized
+# so that a flat response of 1 peaks at 1 at t = 0
+def timedomain(s, df, t, window=WINDOW, beta=BETA):
+    s = np.asarray(s)
+    n = s.shape[-1]
+    x = s * WINDOWS[window](n, beta)
+    t0 = t[0]
+    dt = t[1] - t[0] if len(t) > 1 else 0
+    c = (n - 1) / 2
+    h = czt(x, len(t), np.exp(2j * np.pi * df * dt), np.exp(-2j * np.pi * df * t0))
+    return h * np.exp(-2j * np.pi * c * df * t) / WINDOWS[window](n, beta).sum()
+
+
+# the frequencies of a span around fo, for timedomain
+def timedomain_sweep(fo, span, points=TD_POINTS):
+    df = span / (points - 1)
+    return fo + df * (np.arange(points) - (points - 1) / 2), df
+
+
+# the time-domain S11 and S21 of filters, lists of qk, over a span
+# around fo at the times t, each an array (filters, len(t))
+def nodal_timedomain(qks, bw, fo, qu, span, t, points=TD_POINTS,
+                     window=WINDOW, beta=BETA):
+    f, df = timedomain_sweep(fo, span, points)
+    s11 = [ fn_nodal_reflection(qk, bw, fo)(f, qu) for qk in qks ]
+    s21 = [ fn_nodal_transmission(qk, bw, fo)(f, qu) for qk in qks ]
+    return (timedomain(s11, df, t, window, beta),
+            timedomain(s21, df, t, window, beta))
+
+
+# the times of the dips and the peaks of |h| over the times t, each
+# refined by the parabola through its neighbours in dB
+def timedomain_extrema(h, t):
+    y = db(h)
+    d = np.diff(y)
+    dt = t[1] - t[0]
+    res = []
+    for m in (d[:-1] < 0) & (d[1:] >= 0), (d[:-1] > 0) & (d[1:] <= 0):
+        i = m.nonzero()[0] + 1
+        a, b, c = y[i-1], y[i], y[i+1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = np.where(a - 2 * b + c != 0, (a - c) / (2 * (a - 2 * b + c)), 0)
+        res.append(t[i] + x * dt)
+    return res
+
 
 #######################
 # lossless groupdelay
@@ -262,33 +932,96 @@ def groupdelay_qk(qk, bw):
 
 # calculate the Ness S11 values at fo for a filter with a given QU
 def groupdelay_maqu(g, bw, fo, qu):
-    w, wo, dw, wp = sy.symbols("w wo dw wp")
     ma = []
     for n in range(1, len(g)-1):
-        xin = lowpass_xin(g, wp, n)
-        WP = wo / dw * (w / wo - wo / w) - wo * sy.I / (qu * dw)
-        xin = xin.subs(wp, WP)
-        s11 = (xin * sy.I - g[0]) / (xin * sy.I + g[0])
-        s11 = s11.subs(wo, 2 * sy.pi * fo)
-        s11 = s11.subs(dw, 2 * sy.pi * bw)
-        fn = sy.lambdify(w, s11, 'numpy')
-        ma.append(abs(fn(2 * np.pi * fo)))
+        fn = fn_groupdelay_maqu(g, bw, fo, n)
+        ma.append(abs(fn(fo, qu)))
     return np.array(ma)
 
 
+# the Ness group delay of resonator n only needs the derivative
+# dphi/dwp of the lowpass S11 phase phi = -2 atan(xin / g0).  It is
+# derived once per n with sympy for symbolic g0 ... gn and kept as the
+# source of a numpy function, in memory and in TEMPLATE_FILE (set it
+# to None to not use a file), so later filters never touch sympy.
+# build.sh ships the templates of the common n inside rftune, where
+# they are read with pkgutil as TEMPLATE_FILE can not be written.  The
+# sources are loaded once, and a new template is merged into the file
+# through a temporary file of its own, so that worker processes and
+# server threads deriving templates at once do not lose each other's.
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'templates.pickle')
+templates = {}
+template_sources = None
+template_lock = threading.Lock()
+
+
+def load_templates():
+    try:
+        with open(TEMPLATE_FILE, 'rb') as f:
+            return pickle.load(f)
+    except (EOFError, pickle.UnpicklingError):
+        return {}
+    except OSError:
+        pass
+    try:
+        data = pkgutil.get_data(__name__, 'templates.pickle')
+        return pickle.loads(data) if data else {}
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return {}
+
+
+# merge the sources into TEMPLATE_FILE, unless its directory is not
+# writable or not a directory at all, as inside rftune
+def save_templates(sources):
+    directory = os.path.dirname(TEMPLATE_FILE)
+    if not (os.path.isdir(directory) and os.access(directory, os.W_OK)):
+        return
+    try:
+        with open(TEMPLATE_FILE, 'rb') as f:
+            sources = { **pickle.load(f), **sources }
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=directory, prefix='templates.',
+                                         suffix='.tmp', delete=False) as f:
+            tmp = f.name
+            pickle.dump(sources, f)
+        os.replace(tmp, TEMPLATE_FILE)
+    except OSError:
+        if tmp and os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+# return the function dphi(g0, ..., gn, wp) for resonator n
+def groupdelay_template(n):
+    global template_sources
+    if n not in templates:
+        with template_lock:
+            if template_sources is None:
+                template_sources = load_templates() if TEMPLATE_FILE else {}
+            sources = template_sources
+            if n not in sources:
+                import symbolic
+                sources[n] = symbolic.template_source(n)
+                if TEMPLATE_FILE: save_templates({ n: sources[n] })
+            namespace = {}
+            exec(sources[n], dict(vars(np)), namespace)
+            templates[n] = namespace.popitem()[1]
+    return templates[n]
+
+
 # calculate the Ness group delays at fo for a filter with a given QU
 def groupdelay_tdqu(g, bw, fo, qu):
-    w, wo, dw, wp = sy.symbols("w wo dw wp")
+    wo = 2 * np.pi * fo
+    dw = 2 * np.pi * bw
+    wp = -wo * 1j / (qu * dw)   # the bandpass transform at w = wo
     td = []
     for n in range(1, len(g)-1):
-        xin = lowpass_xin(g, wp, n)
-        phi = -2 * sy.atan(xin / g[0])
-        WP = wo / dw * (w / wo - wo / w) - wo * sy.I / (qu * dw)
-        GD = -sy.diff(WP, w) * sy.simplify(sy.diff(phi, wp)).subs(wp, WP)
-        GD = GD.subs(w, wo)
-        GD = GD.subs(wo, 2 * sy.pi * fo)
-        GD = GD.subs(dw, 2 * sy.pi * bw)
-        td.append(float(GD.evalf()))
+        dphi = groupdelay_template(n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            td.append(np.real(-2 / dw * dphi(*g[:n+1], wp)))
     return np.array(td)
 
 
@@ -296,25 +1029,10 @@ def groupdelay_tdqu(g, bw, fo, qu):
 # reverse
 #######################
 
-# calculate QE and QU from the Ness group delay and return loss at QE 
-def qequ_groupdelay(fo, td1, ma1):
-    wo = 2 * np.pi * fo
-    qequ = (1 - abs(ma1)) / (1 + abs(ma1))
-    qe = wo * td1 / 4 * (1 - qequ**2)
-    qu = qe / qequ if qequ else np.inf
-    return qe, qu
-
+# QE, QU and K12 from the Ness group delays live in reverse.py,
+# which rftune imports on its own for --qequ and --k12
+from reverse import qequ_groupdelay, k12_groupdelay
 
-# calculate QE, QU, and K12 from TD1, TD2, and the RL at QE
-def k12_groupdelay(fo, td1, td2, ma1):
-    qe, qu = qequ_groupdelay(fo, td1, ma1)
-    if np.isinf(qu): qu = 1e99
-    wo = 2 * np.pi * fo
-    k12 = np.sqrt(
-        -1/qu**2 + 2/(qe*td2*wo) + 
-        np.sqrt(-8*qe*td2*wo + 4*qu**2 + td2**2*wo**2)/
-        (qe*qu*td2*wo))
-    return k12
 
 ###
 
@@ -326,16 +1044,76 @@ def reflection_qequ(qk, bw, fo, qu):
     return (1 - qe / qu) / (1 + qe / qu)
 
 
+# for a lossless bandpass filter, calculate the couplings K12 ...
+# K(n-1)n from the Ness group delays td[..., :n] at fo
+def k_groupdelayfo(td, fo):
+    wo = 2 * np.pi * fo
+    td = np.asarray(td, dtype=float)
+    td = np.concatenate((np.zeros(td.shape[:-1] + (2,)), td), axis=-1)
+    return 4 / wo / np.sqrt((td[...,2:-1] - td[...,:-3]) *
+                            (td[...,3:] - td[...,1:-2]))
+
+
 # for a lossless bandpass filter, calculate qk from Ness group delay values at fo
 def qk_groupdelayfo(td, fo):
     wo = 2 * np.pi * fo
     q = wo * td[0] / 4
-    td = np.concatenate((np.zeros(2), td))
-    k = 4 / wo / np.sqrt((td[2:-1] - td[:-3]) * (td[3:] - td[1:-2]))
+    k = k_groupdelayfo(td, fo)
     qk = np.concatenate(([q], k, [q]))
     return qk
 
 
+# the Ness group delay at fo of resonator n = k.shape[-1] + 1 of lossy
+# filters with the external Q qe, the couplings k[..., :n-1] = K12 ...
+# K(n-1)n and the unloaded Q qu.  The delay does not depend on the
+# bandwidth, so the prototype is built for fo / bw = 1.
+def ness_delay(fo, qe, k, qu):
+    g = [ np.ones_like(qe), qe ]
+    for i in range(k.shape[-1]):
+        g.append(1 / (k[...,i]**2 * g[-1]))
+    dphi = groupdelay_template(len(g) - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.real(-1 / (np.pi * fo) * dphi(*g, -1j / qu))
+
+
+# extract QE, QU and the couplings K12 ... K(n-1)n at fo of lossy
+# filters from the Ness group delays td[..., :n] in seconds and the
+# reflection coefficient ma1 at resonator 1.  Each coupling is solved
+# from its delay with the ones before it held, starting from the
+# lossless value.  The leading axes of td and ma1 are measurement sets,
+# e.g. production units, which are all solved together.
+def extract_qk(fo, td, ma1, tol=TOLERANCE):
+    td = np.asarray(td, dtype=float)
+    qequ = (1 - abs(ma1)) / (1 + abs(ma1))
+    qe = 2 * np.pi * fo * td[...,0] / 4 * (1 - qequ**2)
+    with np.errstate(divide='ignore'):
+        qu = qe / qequ
+    finite = np.minimum(qu, 1e99)   # for lossless filters
+    start = k_groupdelayfo(td, fo)
+    k = np.zeros(td.shape[:-1] + (0,))
+    for i in range(td.shape[-1] - 1):
+        fn = lambda x: ness_delay(
+            fo, qe, np.concatenate((k, x[...,None]), axis=-1), finite) - td[...,i+1]
+        x = secant(fn, start[...,i], start[...,i] * 1.001, tol)
+        k = np.concatenate((k, x[...,None]), axis=-1)
+    return qe, qu, k
+
+
+# extract QE1, QE2, QU and the couplings K12 ... K(n-1)n at fo from the
+# full Ness group delay sequences measured from port 1, td1 and ma1,
+# and from port 2, td2 and ma2 starting at resonator n.  Errors build up
+# along a sequence, so the first half of the couplings is taken from
+# port 1 and the rest from port 2; QU is the mean of both.
+def extract_couplings(fo, td1, ma1, td2, ma2, tol=TOLERANCE):
+    qe1, qu1, k1 = extract_qk(fo, td1, ma1, tol)
+    qe2, qu2, k2 = extract_qk(fo, td2, ma2, tol)
+    if k1.shape != k2.shape:
+        raise ValueError('Both ports need the delays of every resonator.')
+    half = (k1.shape[-1] + 1) // 2
+    k = np.concatenate((k1[...,:half], k2[...,::-1][...,half:]), axis=-1)
+    return qe1, qe2, (qu1 + qu2) / 2, k
+
+
 #######################
 # lowpass
 #######################
@@ -346,7 +1124,7 @@ def lowpass_xin(g, wp, n):
     for i in reversed(range(1, n+1)):
         G = wp * g[i]
         if i % 2:
-            xin = 1 / (-G + 1 / xin) if xin else -1 / G
+            xin = 1 / (-G + 1 / xin) if i < n else -1 / G
         else:
             xin += G
     return xin
@@ -356,9 +1134,9 @@ def lowpass_xin(g, wp, n):
 def lowpass_zin(g, wp, qu, n):
     zin = 0
     for i in reversed(range(1, n+1)):
-        G = wp * g[i] * sy.I
+        G = wp * g[i] * 1j
         if i % 2:
-            zin = 1 / (G + 1 / zin) if zin else 1 / G
+            zin = 1 / (G + 1 / zin) if i < n else 1 / G
         else:
             zin += G + wp * g[i] / qu
     return zin
@@ -367,64 +1145,54 @@ def lowpass_zin(g, wp, qu, n):
 # return function fn(f, qu) which calculates the Ness S11 values
 # for lossy lowpass filters shorted at resonator n
 def fn_lowpass_reflection(g, fo, n):
-    f, w, wo, wp, qu = sy.symbols("f w wo wp qu")
-    xin = lowpass_zin(g, wp, qu, n)
-    xin = xin.subs(wp, w / wo)
-    xin = xin.subs(wo, 2 * sy.pi * fo)
-    xin = xin.subs(w, 2 * sy.pi * f)
-    s11 = (xin - g[0]) / (xin + g[0])
-    return sy.lambdify([ f, qu ], s11, 'numpy')
+    wo = 2 * np.pi * fo
+    def s11(w, qu):
+        xin = lowpass_zin(g, w / wo, qu, n)
+        return (xin - g[0]) / (xin + g[0])
+    return network(s11)
 
 
 def fn_lowpass_transmission(g, fo):
-    f, wp, qu = sy.symbols("f wp qu")
-    vin = 1
-    zin = g[0]
-    for i in range(1, len(g)-1):
-        G = wp * g[i] * sy.I
-        if i % 2:
-            a = 1 / G
-            vin = vin * a / (a + zin)
-            zin = 1 / (1 / a + 1 / zin)
-        else:
-            zin += G + wp * g[i] / qu
-    s21 = 2 * vin * g[-1] / (zin + g[-1])
-    s21 = s21.subs(wp, f / fo)
-    return sy.lambdify([f, qu], s21, 'numpy')
+    wo = 2 * np.pi * fo
+    def s21(w, qu):
+        wp = w / wo
+        vin = 1
+        zin = g[0]
+        for i in range(1, len(g)-1):
+            G = wp * g[i] * 1j
+            if i % 2:
+                a = 1 / G
+                vin = vin * a / (a + zin)
+                zin = 1 / (1 / a + 1 / zin)
+            else:
+                zin += G + wp * g[i] / qu
+        return 2 * vin * g[-1] / (zin + g[-1])
+    return network(s21)
                        
 
 ### approximations
 
-def lowpass_groupdelay(g, fo, qu, steps=10000):
+def lowpass_groupdelay(g, fo, qu, steps=STEPS, tol=None):
+    tol = tol or fo * TOLERANCE
     fp = []
     td = []
     for n in range(2, len(g)-2):
         fn = fn_lowpass_reflection(g, fo, n)
         f = np.linspace(0, 2 * fo, steps)
         tdqu = groupdelay(fn, f, qu)
-        a = np.argmax(tdqu)
-        fmax = f[a]
-        peak = tdqu[a]
-        # from scipy.optimize import minimize
-        # res = minimize(lambda x: -groupdelay(fn, x, qu), fmax, method='Nelder-Mead')
-        # fmax = res.x[0] if res.success else np.nan
-        # peak = -res.fun if res.success else np.nan
+        a = np.nanargmax(tdqu)
+        fmax, peak = refine_peak(lambda x: groupdelay(fn, x, qu), f, a, tol)
         fp.append(fmax)
         td.append(peak)
     return fp, td
 
 
-def lowpass_bandwidth(g, fo, qu, steps=10000):
+def lowpass_bandwidth(g, fo, qu, steps=STEPS, tol=None):
+    tol = tol or fo * TOLERANCE
     fn = fn_lowpass_transmission(g, fo)
     f = np.linspace(0, 2 * fo, steps)
     tdqu = groupdelay(fn, f, qu)
-    a = np.argmax(tdqu)
-    fmax = f[a]
-    peak = tdqu[a]
-    # from scipy.optimize import minimize
-    # res = minimize(lambda x: -groupdelay(fn, x, qu), fmax, method='Nelder-Mead')
-    # fmax = res.x[0] if res.success else np.nan
-    # peak = -res.fun if res.success else np.nan
+    a = np.nanargmax(tdqu)
+    fmax, peak = refine_peak(lambda x: groupdelay(fn, x, qu), f, a, tol)
     return fmax, peak
 
-
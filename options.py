@@ -0,0 +1,215 @@
+# the command line options of rftune, which batch jobs share.
+# Only the standard library is imported here so that the --qequ
+# and --k12 paths stay fast.
+
+import argparse
+
+
+# parse a start:stop:count range
+def sweep_range(text):
+    try:
+        start, stop, count = text.split(':')
+        start, stop, count = float(start), float(stop), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected start:stop:count')
+    if count < 1:
+        raise argparse.ArgumentTypeError('expected a count of at least 1')
+    return start, stop, count
+
+
+# parse NAME=PERCENT,... tolerances of L, C, CK, QU and RE
+def tolerances(text):
+    res = {}
+    for item in text.split(','):
+        try:
+            name, value = item.split('=')
+            name, value = name.strip().upper(), float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError('expected NAME=PERCENT,...')
+        if name not in ('L', 'C', 'CK', 'QU', 'RE'):
+            raise argparse.ArgumentTypeError('unknown tolerance {}'.format(name))
+        if value < 0:
+            raise argparse.ArgumentTypeError('expected a tolerance of at least 0')
+        res[name] = value
+    return res
+
+
+# parse OFFSET:DB,... rejections at frequency offsets from fo
+def rejections(text):
+    res = []
+    for item in text.split(','):
+        try:
+            offset, value = item.split(':')
+            res.append((abs(float(offset)), float(value)))
+        except ValueError:
+            raise argparse.ArgumentTypeError('expected OFFSET:DB,...')
+    return res
+
+
+# parse I:J=K,... normalized cross couplings between resonators I and J
+def cross_couplings(text):
+    res = {}
+    for item in text.split(','):
+        try:
+            pair, value = item.split('=')
+            i, j = pair.split(':')
+            res[int(i), int(j)] = float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError('expected I:J=K,...')
+    return res
+
+
+# parse N=QU,... unloaded Qs of resonators N
+def resonator_qus(text):
+    res = {}
+    for item in text.split(','):
+        try:
+            n, value = item.split('=')
+            res[int(n)] = float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError('expected N=QU,...')
+        if res[int(n)] <= 0:
+            raise argparse.ArgumentTypeError('expected a QU above 0')
+    return res
+
+
+# parse a number of worker processes, 0 for one per cpu
+def job_count(text):
+    try:
+        n = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a number of processes')
+    if n < 0:
+        raise argparse.ArgumentTypeError('expected 1 or more processes, or 0 for one per cpu')
+    return n
+
+
+# parse a start:stop:count range of unloaded Qs
+def qu_range(text):
+    import numpy as np
+    return np.linspace(*sweep_range(text))
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(formatter_class=
+             argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("command", nargs='?', choices=['serve'],
+                        help='keep serving analyses over a unix socket')
+    parser.add_argument("-l", "--list", action="store_true")
+    parser.add_argument("-p", "--predistorted", action="store_true", 
+                        help="use Zverev's predistorted filters")
+    parser.add_argument("--q0", type=float,
+                        help='use the predistorted filter of the nearest q0')
+    parser.add_argument("--interpolate", action="store_true",
+                        help='interpolate the predistorted filter of -p at --q0, or at QU bw / fo')
+    parser.add_argument("-g", "--g", action="store_true", 
+                        help="use lowpass prototype table")
+    parser.add_argument("-u", "--qu", type=float, default=float('inf'), 
+                        help='unloaded quality factor')
+    parser.add_argument("-n", "--number", type=int, default=None,
+                        help="number of filter poles")
+    parser.add_argument("-f", "--frequency", type=float, help='center frequency')
+    parser.add_argument("-b", "--bandwidth", type=float, help='bandwidth')
+    parser.add_argument("--zo", type=float, default=50.0, help='line impedance')
+    parser.add_argument("--re", type=float, default=50.0, help='filter impedance')
+    parser.add_argument("--butterworth", action="store_true", help='use a Butterworth filter')
+    parser.add_argument("--bessel", action="store_true", help='use a Bessel filter')
+    parser.add_argument("--legendre", action="store_true", help='use a Lengendre filter')
+    parser.add_argument("--chebyshev", type=float, help='use a Chebyshev filter')
+    parser.add_argument("--gaussian", type=float, help='use a Gaussian filter')
+    parser.add_argument("--linear-phase", type=float, help='use a Linear phase filter')
+    parser.add_argument("--max-ripple", type=float, help='use Chebyshev filter of given ripple')
+    parser.add_argument("--max-swr", type=float, help='use Chebyshev filter of given SWR')
+    parser.add_argument("--max-rc", type=float, help='use Chebyshev filter of given reflection coefficient')
+    parser.add_argument("--validate", action='store_true', help='validate results against k12')
+    parser.add_argument("--lowpass", action='store_true', help='predicted lowpass characteristics')
+    parser.add_argument("--qequ", nargs=2, metavar=('<RL1(dB)>', '<TD1(ns)>',), type=float,
+                        help='calculate QE and QU using resonator 1 group delay and return loss')
+    parser.add_argument("--k12", nargs=3, metavar=('<RL1(dB)>', '<TD1(ns)>', '<TD2(ns)>'), type=float,
+                        help='calculate k12 using resonator 1 and 2 group delay and return loss')
+    parser.add_argument("--stream", metavar='FILE',
+                        help='calculate QE, QU and k12 for each line of RL1(dB) TD1(ns) '
+                             '[TD2(ns) ...] read from FILE, a FIFO or - for stdin, '
+                             'against the Ness delays of the selected filter')
+    parser.add_argument("--measured", nargs='+', metavar='FILE',
+                        help='calculate QE, QU and k12 from measured .s1p sweeps of '
+                             'resonators 1, 1-2, 1-3, ... with the rest shorted')
+    parser.add_argument("--measured2", nargs='+', metavar='FILE',
+                        help='measured .s1p sweeps of resonators n, n-(n-1), ... from '
+                             'port 2, to extract every coupling from both ports')
+    parser.add_argument("--aperture", type=int, default=1, metavar='POINTS',
+                        help='group delay aperture of --measured in points either side')
+    parser.add_argument("--qu-sweep", type=qu_range, metavar='START:STOP:COUNT',
+                        help='tabulate the losses and Ness delays over a range of unloaded Qs')
+    parser.add_argument("--csv", action='store_true', help='write the --qu-sweep table as CSV')
+    parser.add_argument("--touchstone", metavar='FILE',
+                        help='write S11 to a .s1p or S11, S21, S12 and S22 to a .s2p file')
+    parser.add_argument("--sweep", type=sweep_range, metavar='START:STOP:COUNT',
+                        help='frequencies of the touchstone file (default: fo-2bw:fo+2bw:1001)')
+    parser.add_argument("--coupling-matrix", action='store_true',
+                        help='analyze the normalized coupling matrix of the filter')
+    parser.add_argument("--cross", type=cross_couplings, metavar='I:J=K,...',
+                        help='normalized cross couplings of the coupling matrix')
+    parser.add_argument("--resonator-qu", type=resonator_qus, metavar='N=QU,...',
+                        help='unloaded Qs of single resonators of the coupling matrix, '
+                             'the rest having --qu')
+    parser.add_argument("--time-domain", action='store_true',
+                        help='times of the dips and peaks of the time-domain S11 and S21')
+    parser.add_argument("--window", default='kaiser',
+                        choices=['rect', 'hann', 'hamming', 'blackman', 'kaiser'],
+                        help='window of the time-domain transform')
+    parser.add_argument("--span", type=float,
+                        help='frequency span of the time-domain transform (default: 4bw)')
+    parser.add_argument("--gate", type=sweep_range, metavar='START:STOP:COUNT',
+                        help='times in ns of the time-domain response '
+                             '(default: 0 to twice the longest Ness delay, 401 points)')
+    parser.add_argument("--sensitivity", action='store_true',
+                        help='changes of the Ness delays, return losses and passband '
+                             'metrics for +1% of each q and k')
+    parser.add_argument("--monte-carlo", type=int, metavar='SAMPLES',
+                        help='yield of SAMPLES filters with perturbed components')
+    parser.add_argument("--tolerance", type=tolerances, default={},
+                        metavar='NAME=PERCENT,...',
+                        help='tolerances of L, C, CK, QU and RE in percent '
+                             '(default: L=0.05,C=0.05,CK=1,QU=10,RE=1)')
+    parser.add_argument("--distribution", default='normal', choices=['normal', 'uniform'],
+                        help='distribution of the deviations, normal with the tolerance as 3 sigma')
+    parser.add_argument("--seed", type=int, default=0, help='seed of the Monte Carlo draws')
+    parser.add_argument("--spec-il", type=float, metavar='DB',
+                        help='maximum insertion loss at fo of the yield and the search')
+    parser.add_argument("--spec-rl", type=float, metavar='DB',
+                        help='minimum return loss of the yield and the search')
+    parser.add_argument("--spec-bw", type=float, metavar='HZ',
+                        help='minimum 3dB bandwidth of the yield and the search')
+    parser.add_argument("--search", action='store_true',
+                        help='rank the filters of every table meeting the --spec options')
+    parser.add_argument("--spec-rejection", type=rejections, metavar='OFFSET:DB,...',
+                        help='minimum rejection of the search at fo +/- OFFSET Hz')
+    parser.add_argument("--spec-delay", type=float, metavar='NS',
+                        help='maximum transmission delay variation of the search')
+    parser.add_argument("--delay-band", type=float, metavar='HZ',
+                        help='band around fo of --spec-delay (default: bw)')
+    parser.add_argument("--top", type=int, default=10,
+                        help='number of filters listed by the search')
+    parser.add_argument("--cache", metavar='FILE',
+                        help='persist the transfer function cache in this file')
+    parser.add_argument("--batch", metavar='FILE',
+                        help='analyze the jobs in a JSONL or CSV file (- for stdin), writing JSONL')
+    parser.add_argument("--profile", nargs='?', const='table', choices=['table', 'json'],
+                        help='print the time, calls and evaluations per function to stderr')
+    parser.add_argument("--socket", metavar='PATH',
+                        help='unix socket of rftune serve, else $RFTUNE_SOCKET '
+                             'or rftune-UID.sock in $XDG_RUNTIME_DIR or /tmp')
+    parser.add_argument("--local", action='store_true',
+                        help='analyze in this process even when rftune serve is running')
+    parser.add_argument("-j", "--jobs", type=job_count, default=1,
+                        help='number of worker processes for batch jobs (0 for one per cpu)')
+    return parser
+
+
+def parse_args():
+    parser = make_parser()
+    args = parser.parse_args()
+    if args.interpolate and not args.predistorted:
+        parser.error('--interpolate needs -p')
+    return args
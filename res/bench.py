@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+# benchmark the ness.py entry points and the analysis pipeline of rftune
+# on Chebyshev 0.1 dB filters of 2 to 10 poles from the COUPLED, LOWPASS
+# and ZVEREV tables, writing the timings as JSON.  With --compare, the
+# timings are checked against a stored baseline and the run fails when
+# any benchmark is slower by more than the threshold.
+#
+#   PYTHONPATH=. python3 res/bench.py -o baseline.json
+#   PYTHONPATH=. python3 res/bench.py --compare baseline.json
+#
+# Every benchmark starts from an empty transfer function cache.  Compare
+# only against baselines taken on the same machine when it is idle.
+
+import numpy as np
+import argparse, contextlib, io, json, platform, re, sys, time
+
+import ness
+from analysis import select_filters, analyze, report
+from options import make_parser
+
+FO = 1e9
+BW = 10e6
+QU = 2000
+POINTS = 1000
+POLES = range(2, 11)
+MIN_TIME = 0.05     # seconds spent at least on each benchmark
+
+TABLES = {
+    'COUPLED': [],
+    'LOWPASS': [ '-g' ],
+    'ZVEREV': [ '-p', '--q0', '4' ],
+}
+
+
+# return the parsed options of the pipeline for a table and pole count
+def case_args(table, n):
+    argv = [ '-n', str(n), '--chebyshev', '0.1', '-f', str(FO), '-b', str(BW),
+             '-u', str(QU) ] + TABLES[table]
+    return make_parser().parse_args(argv)
+
+
+# the functions to time for a filter d from select_filters
+def entry_points(d, args):
+    qk, g = d['qk'], d['g']
+    f = np.linspace(FO - 2 * BW, FO + 2 * BW, POINTS)
+    return {
+        'fn_nodal_transmission': lambda: ness.fn_nodal_transmission(qk, BW, FO)(f, QU),
+        'fn_nodal_reflection': lambda: ness.fn_nodal_reflection(qk, BW, FO)(f, QU),
+        'groupdelay_maqu': lambda: ness.groupdelay_maqu(g, BW, FO, QU),
+        'groupdelay_tdqu': lambda: ness.groupdelay_tdqu(g, BW, FO, QU),
+        'nodal_returnloss': lambda: ness.nodal_returnloss(qk, BW, FO, QU),
+        'nodal_bandwidth': lambda: ness.nodal_bandwidth(qk, BW, FO, QU),
+        'lowpass_groupdelay': lambda: ness.lowpass_groupdelay(g, FO, QU),
+        'main': lambda: pipeline(args),
+    }
+
+
+# select, analyze and report the filters of args as main() does
+def pipeline(args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for d in select_filters(args):
+            report(analyze(d, args), args)
+
+
+# return the minimum and median seconds of at least repeat calls
+# of fn, calling it until MIN_TIME is spent to steady the minimum
+def measure(fn, repeat):
+    times = []
+    while len(times) < repeat or sum(times) < MIN_TIME:
+        ness.cache.clear()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return { 'min': min(times), 'median': float(np.median(times)) }
+
+
+def run(repeat, pattern=None):
+    results = {}
+    for table in TABLES:
+        for n in POLES:
+            args = case_args(table, n)
+            data = select_filters(args)
+            if not data:
+                continue
+            for name, fn in entry_points(data[0], args).items():
+                key = '{}/{}/N={}'.format(name, table, n)
+                if pattern and not re.search(pattern, key):
+                    continue
+                fn()    # warm up templates and code paths
+                results[key] = measure(fn, repeat)
+                print('{:40s} {:10.3f} ms'.format(key, results[key]['min'] * 1e3),
+                      file=sys.stderr)
+    return results
+
+
+# return the benchmarks slower than the baseline by more than threshold
+def compare(results, baseline, threshold):
+    slower = {}
+    for key, res in results.items():
+        base = baseline.get(key)
+        if base:
+            ratio = res['min'] / base['min']
+            if ratio > 1 + threshold:
+                slower[key] = ratio
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='flag regressions against a baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative slowdown counted as a regression')
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per benchmark')
+    parser.add_argument('-k', metavar='PATTERN', help='run the benchmarks matching this regex')
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.k)
+    doc = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(doc, f, indent=1)
+    else:
+        print(json.dumps(doc, indent=1))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        slower = compare(results, baseline, args.threshold)
+        for key, ratio in sorted(slower.items()):
+            print('REGRESSION {:40s} {:6.2f}x'.format(key, ratio), file=sys.stderr)
+        missing = sorted(set(baseline) - set(results))
+        if missing and not args.k:
+            print('missing {} baseline benchmarks'.format(len(missing)), file=sys.stderr)
+        sys.exit(1 if slower else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+# check the numpy evaluators of ness.py against the sympy references of
+# symbolic.py: run symbolic.crosscheck() for filters of several orders,
+# unloaded Qs and terminations, and fail when any transfer function or
+# Ness group delay differs by more than the tolerance.  The sympy forms
+# round differently from the numpy ones, by up to 1e-7 at 6 poles, so
+# the default tolerance only lets rounding through.  build.sh runs it
+# before building rftune.
+#
+#   python3 res/crosscheck.py [--tolerance REL]
+
+import argparse, os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ness, symbolic
+
+# (name, g, bw, fo, qu, re) of the filters checked
+FILTERS = [
+    ('Butterworth 3',     ness.butterworth(3),     10e6, 1e9,   2000., 1),
+    ('Bessel 4',          ness.bessel(4),          10e6, 1e9,    500., 1.3),
+    ('Chebyshev 0.1 dB 5', ness.chebyshev(5, .1),  20e6, 2.3e9, 1400., 0.8),
+    ('Legendre 6',        ness.legendre(6),         5e6, 450e6,  800., 1),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tolerance', type=float, default=1e-6,
+                        help='largest relative difference allowed')
+    args = parser.parse_args()
+
+    failed = False
+    for name, g, bw, fo, qu, re in FILTERS:
+        err = symbolic.crosscheck(g, bw, fo, qu, re=re)
+        worst = max(err, key=err.get)
+        bad = [ key for key, x in err.items() if not x <= args.tolerance ]
+        failed = failed or bool(bad)
+        print('{:4s} {:20s} worst {:9.2e} in {}{}'.format(
+              'FAIL' if bad else 'ok', name, err[worst], worst,
+              '  failed ' + ', '.join(bad) if bad else ''))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
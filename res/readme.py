@@ -18,7 +18,8 @@ print(f"""
 # rftune
 
 Python 3 script for tuning, specifically narrow-band, bandpass filters.
-The script requires the numpy and sympy library.
+The script requires the numpy library.  The sympy library is
+needed only to build it, or for filters of more than 20 poles.
 
 ## Overview
 
@@ -38,6 +39,30 @@ To build the rftune executable, run:
 sh build.sh
 ```
 
+The reverse calculations with --qequ and --k12 import neither numpy
+nor the coefficient tables, so they answer in a few tens of milliseconds.
+To check this startup budget, run:
+
+```
+python3 res/startup.py rftune
+```
+
+To time the ness.py entry points and the analysis pipeline for filters
+of 2 to 10 poles, and to check a change against a baseline, run:
+
+```
+PYTHONPATH=. python3 res/bench.py -o baseline.json
+PYTHONPATH=. python3 res/bench.py --compare baseline.json
+```
+
+build.sh first checks the numpy evaluators of ness.py against the
+sympy references of symbolic.py for filters of 3 to 6 poles, which
+can also be run on its own:
+
+```
+python3 res/crosscheck.py
+```
+
 ## Example
 
 To predict the properties of a 6 pole Chebyshev filter of 0.01 dB ripple centered at 2.3 GHz
@@ -73,6 +98,232 @@ To find k12 use:
 
 { run("rftune -f 2.3e9 --k12 .830 18.534 32.025") }
 
+# Coupling Matrix
+
+`--coupling-matrix` adds the normalized coupling matrix of the filter
+to the report, with its response and Ness delays solved from the
+matrix instead of the nodal circuit.  `--cross I:J=K,...` adds
+normalized cross couplings between resonators I and J, and
+`--resonator-qu N=QU,...` gives single resonators their own unloaded
+Q, the rest having -u; either implies `--coupling-matrix`.  The matrix
+is solved at every frequency at once, by the Thomas algorithm for
+in-line filters and by a batched `np.linalg.solve` with cross
+couplings.  Without them it agrees with the nodal filter at fo, while
+its couplings do not change over the band.  A negative K14 gives a
+quartet its pair of transmission zeros:
+
+```
+$ rftune --cheb .1 -n 4 -f 1e9 -b 20e6 -u 2000 --cross 1:4=-0.1
+```
+
+# Time Domain
+
+`--time-domain` adds the bandpass mode time-domain response of network
+analyzers to the report: S11 and S21 over a span around fo, 4bw unless
+`--span` says otherwise, are windowed with `--window` (kaiser by
+default, also rect, hann, hamming and blackman) and transformed to
+time.  Only the times of `--gate START:STOP:COUNT` in ns are computed,
+by the chirp-z transform, by default up to twice the longest Ness
+delay.  The dips of S11 mark the resonators and its peaks the
+couplings, the times to tune to in Dishal's time-domain method.  In
+Python, `ness.nodal_timedomain` takes a list of filters and transforms
+them together.
+
+```
+$ rftune --cheb .1 -n 5 -f 1e9 -b 10e6 -u 3000 --time-domain --window hann
+```
+
+# Searching the Tables
+
+`--search` checks every filter of the COUPLED, ZVEREV and LOWPASS
+tables at -f, -b and -u against the specs given and lists the best
+`--top` of those meeting them, fewest poles first, then lowest loss.
+The specs are the loss at fo `--spec-il`, the minimum return loss
+`--spec-rl`, the 3dB bandwidth `--spec-bw`, the rejection at
+`--spec-rejection OFFSET:DB,...` on both sides of fo and the
+transmission delay variation `--spec-delay` in ns over
+`--delay-band`, by default the bandwidth.  Each filter is dropped at
+the first spec it misses, the cheap ones first, with a margin below
+the Cohn estimate of the loss, checked against every row for q0 of 1
+and above, ruling out many before any network is evaluated.
+Predistorted filters are evaluated at their own q0 and skipped when it
+is beyond the q0 of -u.  `-n` limits the search to one pole count and
+`-j` shares it out over worker processes.
+
+```
+$ rftune --search -f 1e9 -b 10e6 -u 3000 --spec-il 2 --spec-rl 15 --spec-rejection 10e6:25 --spec-delay 60
+```
+
+# Sensitivity
+
+`--sensitivity` tabulates how much the Ness delays and return losses
+from either port, the insertion loss, the minimum return loss and the
+3dB bandwidth change for +1% of each q and k, which shows the coupling
+or resonator to adjust for a given error.  The Jacobians are exact,
+computed in one evaluation with every coefficient carried as a dual
+number rather than by re-analysing perturbed filters; the band edges
+follow the coefficients through the frequency derivative.  In Python,
+`ness.nodal_sensitivity` returns each metric with its Jacobian per
+unit of qk.
+
+```
+$ rftune --cheb .1 -n 5 -f 1e9 -b 10e6 -u 2000 --sensitivity
+```
+
+# Monte Carlo Yield
+
+`--monte-carlo SAMPLES` perturbs the nodal network of the selected
+filter SAMPLES times and reports the spread of its insertion loss at
+fo, its minimum return loss and its 3dB bandwidth, defined as in the
+report of the filter.  The resonator L and C, the coupling capacitors CK, the
+unloaded Q of each resonator and the termination RE are varied by the
+percent tolerances of `--tolerance NAME=PERCENT,...`, drawn from a
+normal distribution with the tolerance as 3 sigma or, with
+`--distribution uniform`, uniformly within it; `--seed` makes runs
+repeatable.  `--spec-il`, `--spec-rl` and `--spec-bw` add the fraction
+of samples passing each spec and the yield passing all of them.  The
+samples are evaluated as arrays in chunks, so 10000 take a few seconds.
+
+```
+$ rftune --cheb .1 -n 5 -f 1e9 -b 10e6 -u 2000 --monte-carlo 5000 --tolerance L=0.1,C=0.1 --spec-il 2 --spec-rl 15
+```
+
+# Touchstone Export
+
+`--touchstone FILE` writes the predicted S11 of the selected filter to
+a .s1p file, or S11, S21, S12 and S22 to a .s2p file, as real and
+imaginary parts referenced to --zo.  The frequencies are given with
+`--sweep START:STOP:COUNT` and default to fo +/- 2 bw in 1001 points.
+Sweeps are evaluated and written in chunks, so million point files
+need little memory.  When several filters are selected, the files
+are numbered.
+
+```
+$ rftune --cheb .1 -n 4 -f 1e9 -b 10e6 -u 2000 --touchstone filter.s2p --sweep 0.9e9:1.1e9:100001
+```
+
+# Streaming Measurements
+
+For tuning on the bench, `--stream FILE` reads one measurement per
+line from FILE, a FIFO, or - for stdin, and prints QU, QE and k12 for
+each as soon as it arrives, without starting rftune again.  A line
+holds RL1 in dB and the Ness group delays TD1, TD2, ... in ns measured
+so far.  When a filter is selected, its target Ness delays, RL1, QE and
+k12 are printed first and every line is compared against them.
+
+```
+$ mkfifo meas
+$ rftune --cheb .1 -n 4 -f 1e9 -b 10e6 -u 2000 --stream meas &
+$ echo "1.2 85.7 101.3" > meas
+```
+
+# Measured Sweeps
+
+Instead of reading the Ness group delays and return losses off the
+analyzer, give rftune the measured S11 sweeps with `--measured FILE ...`,
+the first .s1p file measured with resonator 1 tuned and the others
+shorted, the second with resonators 1 and 2, and so on.  The group
+delay of every sweep is computed from its unwrapped phase, TD and RL
+are taken at fo, and QU, QE and k12 are calculated from them.  Without
+-f, fo is the group delay peak of the first sweep.  Noisy phase is
+smoothed with `--aperture POINTS`, the number of points on either side
+of each group delay difference.  As with --stream, a selected filter
+gives the targets to compare against.
+
+```
+$ rftune --cheb .1 -n 4 -f 1e9 -b 10e6 -u 2000 --aperture 20 --measured res1.s1p res12.s1p res123.s1p res1234.s1p
+```
+
+Beyond K12, every coupling is extracted from the full sequence for the
+lossy filter, each solved from its Ness delay with the couplings before
+it held, starting from the lossless values.  Errors build up along the
+sequence, so with the sweeps measured from port 2 as well,
+`--measured2 FILE ...` starting at resonator n, the first half of the
+couplings comes from port 1 and the rest from port 2.
+
+```
+$ rftune -f 1e9 --measured res1.s1p res12.s1p res123.s1p res1234.s1p --measured2 res4.s1p res43.s1p res432.s1p res4321.s1p
+```
+
+In Python, `ness.extract_qk(fo, td, ma1)` and `ness.extract_couplings(fo,
+td1, ma1, td2, ma2)` take arrays of measurement sets, the delays with
+shape (units, n), and solve all of them in one batched call.
+
+# Sweeping the Unloaded Q
+
+To choose a resonator technology, `--qu-sweep START:STOP:COUNT` tabulates
+the insertion loss, the minimum return loss, the transmission delay
+and every Ness group delay and return loss of the filter
+over COUNT unloaded Qs from START to STOP.
+Each transfer function is built once and evaluated over all the Qs together.
+Add `--csv` to write the table as CSV.
+The columns TDp_n and RLp_n are the Ness values
+with n resonators counted from port p.
+
+```
+$ rftune -g --cheb .01 -n 6 -f 2.3e9 -b 26.9e6 --qu-sweep 500:5000:200 --csv > sweep.csv
+```
+
+# Batch Mode
+
+Many analyses can be run in one process with `--batch FILE`, where FILE
+is a JSONL file, a CSV file (ending in .csv), or - for stdin.
+Each JSON line or CSV row is a job whose keys are the long option names.
+Options given on the command line act as defaults for every job.
+Every value is checked like the option on the command line, null or
+empty values keep the default, and a job that fails gets an "error"
+in its line without stopping the rest.
+The tables and cached transfer functions are shared by all the jobs,
+and the results are written as one JSON line per job.
+With `-j N` the jobs are spread over N worker processes
+(0 for one per cpu) and the results are still written in input order;
+with `--cache` the transfer functions the workers build are handed
+back and saved with the rest.
+
+```
+$ cat jobs.jsonl
+{{"chebyshev": 0.01, "g": true, "number": 6, "bandwidth": 26.9e6, "qu": 1400}}
+{{"qequ": [0.830, 18.534]}}
+{{"k12": [0.830, 18.534, 32.025]}}
+$ rftune -f 2.3e9 --batch jobs.jsonl
+```
+
+# Server Mode
+
+`rftune serve` keeps the tables, the Ness templates and the cached
+transfer functions loaded and answers requests on a unix socket,
+$RFTUNE_SOCKET or rftune-UID.sock in $XDG_RUNTIME_DIR or /tmp unless
+`--socket PATH` is given.  While it runs, rftune hands its command line
+to the server and prints the answer, so a call costs little more than
+the arithmetic.  Use `--local` to analyze in the calling process.
+Batch, cache and profile runs are always local.
+
+Scripts can talk to the server directly.  Each request is a JSON line,
+either `{"argv": [...]}` or a job record as in batch mode, and each
+answer is a JSON line with the `results`, the printed `output`, and
+an `error` when the request failed.  Requests are served concurrently.
+Options that read or write files, such as `--touchstone`, are refused
+in either form, so the server never writes files of its own.
+
+```
+$ rftune serve &
+$ echo '{"bessel": true, "number": 4, "frequency": 1e9, "bandwidth": 1e7, "qu": 2000}' |
+    nc -U /tmp/rftune-$(id -u).sock
+```
+
+# Profiling
+
+Add `--profile` to print, on stderr, the time spent in and the calls of
+every ness.py function and analysis stage, with the number of points
+at which the transfer functions were evaluated, or `--profile json` for
+the same as JSON.  Times and evaluations include those of the
+functions called.  Batch jobs run in worker processes with `-j` are
+not profiled.
+
+```
+$ rftune --cheb .1 -n 6 -f 1e9 -b 10e6 -u 2000 --profile > /dev/null
+```
+
 # Usage
 
 { run("rftune -h") }
@@ -89,7 +340,24 @@ The following coupled filter coefficients are supported.
 
 { run("rftune --list") }
 
+Butterworth, Bessel, Gaussian and Legendre prototypes are synthesized
+for the pole counts missing from the lowpass and coupled tables, so
+`rftune --bessel -n 14` needs no table row.  They are normalized like
+the tables to the 3dB bandwidth, and the built rftune stores those of
+up to 20 poles.
+
 The following predistorted coupled filter coefficients from Zverev [3] are supported.
+Each family lists a design for several predistortions q0 at every pole
+count; use --q0 to pick the one of the nearest q0.  With --interpolate
+the coefficients are interpolated at --q0, or at the q0 = QU bw / fo of
+the resonators when --q0 is not given, so one analysis at the actual q0
+replaces scanning the rows.  Each design branch is followed across the
+q0s and interpolated by a cubic spline over 1 / q0, so higher orders
+give one filter per branch that spans the q0.
+
+```
+$ rftune -p --butterworth -n 3 -f 1e9 -b 10e6 -u 1200 --interpolate
+```
 
 { run("rftune -p --list") }
 
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# check the startup budget of the --qequ and --k12 reverse calculators:
+# run them under -X importtime and fail when a heavy module is imported
+# or when the best wall time of several runs is over the budget.
+#
+#   python3 res/startup.py [--budget MS] [--runs N] [TARGET]
+#
+# TARGET is the source directory (default .) or the rftune zipapp.
+
+import argparse, subprocess, sys, time
+
+# modules the reverse calculators must not import
+FORBIDDEN = [ 'numpy', 'sympy', 'tables', 'ness', 'analysis',
+              'coupled', 'zverev', 'lowpass' ]
+
+COMMANDS = [
+    [ '-f', '2.3e9', '--qequ', '.83', '18.534' ],
+    [ '-f', '2.3e9', '--k12', '.83', '18.534', '40.1' ],
+]
+
+
+# return the { module: cumulative microseconds } of a -X importtime run,
+# top level modules being named without their indent
+def importtime(target, command):
+    proc = subprocess.run([ sys.executable, '-X', 'importtime', target ] + command,
+                          capture_output=True, text=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                times[name[1:].rstrip()] = int(cumulative)
+    return times
+
+
+# best wall time in milliseconds of running the command
+def walltime(target, command, runs):
+    best = None
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.run([ sys.executable, target ] + command, capture_output=True)
+        elapsed = (time.perf_counter() - start) * 1e3
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=float, default=50, help='wall time budget in ms')
+    parser.add_argument('--runs', type=int, default=10, help='runs per command')
+    parser.add_argument('target', nargs='?', default='.')
+    args = parser.parse_args()
+
+    failed = False
+    for command in COMMANDS:
+        times = importtime(args.target, command)
+        names = [ name.strip() for name in times ]
+        heavy = [ name for name in FORBIDDEN if name in names ]
+        total = sum(us for name, us in times.items() if not name.startswith(' '))
+        wall = walltime(args.target, command, args.runs)
+        ok = not heavy and wall <= args.budget
+        failed = failed or not ok
+        print('{:4s} {:30s} imports {:6.1f} ms  wall {:6.1f} ms{}'.format(
+              'ok' if ok else 'FAIL', ' '.join(command), total / 1e3, wall,
+              '  imported ' + ', '.join(heavy) if heavy else ''))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
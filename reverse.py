@@ -0,0 +1,57 @@
+# reverse calculations of QE, QU and K12 from measured Ness group
+# delays and return losses.  These are plain python, so that the
+# --qequ and --k12 paths of rftune answer without importing numpy.
+
+import math
+
+
+def sqrt(x):
+    return x ** 0.5 if x >= 0 else math.nan
+
+
+# calculate QE and QU from the Ness group delay and return loss at QE
+def qequ_groupdelay(fo, td1, ma1):
+    wo = 2 * math.pi * fo
+    qequ = (1 - abs(ma1)) / (1 + abs(ma1))
+    qe = wo * td1 / 4 * (1 - qequ**2)
+    qu = qe / qequ if qequ else math.inf
+    return qe, qu
+
+
+# calculate QE, QU, and K12 from TD1, TD2, and the RL at QE
+def k12_groupdelay(fo, td1, td2, ma1):
+    qe, qu = qequ_groupdelay(fo, td1, ma1)
+    if math.isinf(qu): qu = 1e99
+    wo = 2 * math.pi * fo
+    k12 = sqrt(
+        -1/qu**2 + 2/(qe*td2*wo) +
+        sqrt(-8*qe*td2*wo + 4*qu**2 + td2**2*wo**2)/
+        (qe*qu*td2*wo))
+    return k12
+
+
+# calculate QE, QU and optionally K12 from --qequ or --k12 measurements
+def reverse(args):
+    fo = args.frequency
+    if not fo:
+        raise ValueError("Center frequency not set.")
+    rl = args.qequ or args.k12
+    ma1 = 10**(-rl[0] / 20)
+    td1 = rl[1] * 1e-9
+    qe, qu = qequ_groupdelay(fo, td1, ma1)
+    res = { 'QU': qu, 'QE': qe }
+    if args.k12:
+        td2 = args.k12[2] * 1e-9
+        res['K12'] = k12_groupdelay(fo, td1, td2, ma1)
+    return res
+
+
+# print the QE, QU and K12 of --qequ or --k12
+def report_reverse(res, args):
+    if args.qequ:
+        print('QU = {:11.3f}'.format(res['QU']))
+        print('QE = {:11.3f}'.format(res['QE']))
+    else:
+        print('QU  = {:11.3f}'.format(res['QU']))
+        print('QE  = {:11.3f}'.format(res['QE']))
+        print('K12 = {:11.6f}'.format(res['K12']))
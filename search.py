@@ -0,0 +1,179 @@
+# the design-space search behind --search: every row of the COUPLED,
+# ZVEREV and LOWPASS tables is a candidate, checked against the specs
+# of args at fo, bw and QU and ranked by pole count then insertion loss.
+# The checks run from the cheapest to the dearest and a candidate is
+# dropped at the first it fails, so the Cohn estimate of the insertion
+# loss prunes many filters before any network is evaluated, and the
+# return loss, which needs a search over the ripple peaks, is left to
+# the few that meet every other spec.  The candidates are shared out
+# over args.jobs worker processes.  The insertion loss is the loss at
+# fo, so the ripple of even order filters counts against it.  A filter
+# found in several tables is listed once.
+#
+# A predistorted ZVEREV row is built for resonators of its q0, so it is
+# evaluated at QU = q0 fo / bw, and dropped when q0 is beyond the
+# q0 = QU bw / fo the resonators allow.
+
+import numpy as np
+import concurrent.futures, itertools, os
+
+import tables
+from ness import (
+    prototype_qk, coupling_g, insertion_loss, db, groupdelay,
+    fn_nodal_transmission, nodal_returnloss, nodal_bandwidth,
+)
+
+# the loss at fo of the tabled filters is at least COHN_BOUND times the
+# Cohn estimate for q0 = QU bw / fo of COHN_Q0 and above.  This is no
+# theorem but a margin checked against every row: the ZVEREV rows at
+# their own q0 reach 0.381 (Chebyshev 0.01 dB, 6 poles, q0 9.993) and
+# the rest 0.786 over q0 from 1 to 10000, rising towards 1 with q0.
+# Below COHN_Q0 the ratio keeps falling, so nothing is pruned there.
+COHN_BOUND = 0.35
+COHN_Q0 = 1
+DELAY_STEPS = 101
+CHUNK = 16
+
+# the checks in the order they are made, cheapest first
+STAGES = {
+    'q0': 'q0 beyond QU', 'cohn': 'Cohn bound', 'il': 'insertion loss',
+    'rejection': 'rejection', 'delay': 'delay variation',
+    'bwdb': 'bandwidth', 'rl': 'return loss',
+}
+
+
+# the coefficients qk and the predistortion q0 of a row of a table
+def row_qk(name, row):
+    if name == 'LOWPASS':
+        return coupling_g(row), np.inf
+    q0 = np.inf
+    if name == 'ZVEREV':
+        q0, row = row[0], row[2:]
+    return np.array(row[:1] + row[2:] + row[1:2]), q0
+
+
+# the (table, key, row) of every candidate with n poles, or any
+def candidates(n=None):
+    for name in tables.MODULES:
+        for key, rows in tables.load(name).items():
+            for row in rows:
+                if n is None or tables.row_poles(name, row)[0] == n:
+                    yield name, key, row
+
+
+# check a candidate against spec, returning the stage it failed at,
+# or None, and its results
+def evaluate(candidate, spec):
+    name, key, row = candidate
+    fo, bw, qu = spec['fo'], spec['bw'], spec['qu']
+    qk, q0 = row_qk(name, row)
+    N = len(qk) - 1
+    r = { 'table': name, 'name': key, 'N': N, 'q0': q0, 'qk': qk }
+    if np.isfinite(q0):
+        if q0 > qu * bw / fo:
+            return 'q0', r
+        qu = q0 * fo / bw
+    r['qu'] = qu
+    il = spec.get('il')
+    if (il is not None and qu * bw / fo >= COHN_Q0 and
+            COHN_BOUND * insertion_loss(prototype_qk(qk), bw, fo, qu) > il):
+        return 'cohn', r
+
+    fn = fn_nodal_transmission(qk, bw, fo)
+    r['il'] = -db(fn(fo, qu))
+    if il is not None and r['il'] > il:
+        return 'il', r
+
+    if spec.get('rejection'):
+        r['rejection'] = [ min(-db(fn(fo - x, qu)), -db(fn(fo + x, qu)))
+                           for x, _ in spec['rejection'] ]
+        if any(a < b for a, (_, b) in zip(r['rejection'], spec['rejection'])):
+            return 'rejection', r
+
+    if spec.get('delay') is not None:
+        band = spec.get('band') or bw
+        f = np.linspace(fo - band / 2, fo + band / 2, DELAY_STEPS)
+        td = groupdelay(fn, f, qu)
+        r['delay'] = td.max() - td.min()
+        if r['delay'] > spec['delay']:
+            return 'delay', r
+
+    if spec.get('bwdb') is not None:
+        r['bwdb'] = nodal_bandwidth(qk, bw, fo, qu)
+        if not r['bwdb'] >= spec['bwdb']:
+            return 'bwdb', r
+
+    r['rl'] = nodal_returnloss(qk, bw, fo, qu)
+    if spec.get('rl') is not None and r['rl'] < spec['rl']:
+        return 'rl', r
+    return None, r
+
+
+# the specs of args
+def specs(args):
+    return {
+        'fo': args.frequency, 'bw': args.bandwidth, 'qu': args.qu,
+        'il': args.spec_il, 'rl': args.spec_rl, 'bwdb': args.spec_bw,
+        'rejection': args.spec_rejection, 'band': args.delay_band,
+        'delay': None if args.spec_delay is None else args.spec_delay * 1e-9,
+    }
+
+
+# search the tables for the filters meeting the specs of args,
+# returning the counts dropped at each stage and the top ranked
+def search(args, jobs=None):
+    spec = specs(args)
+    if not (spec['fo'] and spec['bw']):
+        raise ValueError('Center frequency and bandwidth not set.')
+    jobs = jobs or args.jobs or os.cpu_count()
+    cands = list(candidates(args.number))
+    if jobs == 1:
+        res = list(map(evaluate, cands, itertools.repeat(spec)))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            res = list(executor.map(evaluate, cands, itertools.repeat(spec),
+                                    chunksize=CHUNK))
+    dropped = { stage: 0 for stage in STAGES }
+    passed = {}
+    for stage, r in res:
+        if stage is not None:
+            dropped[stage] += 1
+            continue
+        key = r['name'], r['q0'], tuple(np.round(r['qk'], 3))
+        passed.setdefault(key, r)
+    passed = sorted(passed.values(), key=lambda r: (r['N'], r['il']))
+    return {
+        'candidates': len(cands), 'dropped': dropped,
+        'passed': len(passed), 'filters': passed[:args.top],
+    }
+
+
+# print the ranked shortlist of search
+def report(res, args):
+    print('Searched {} filters, {} meet the specs'.format(
+          res['candidates'], res['passed']))
+    if any(res['dropped'].values()):
+        print('  dropped: ' + ', '.join('{} on {}'.format(n, STAGES[stage])
+              for stage, n in res['dropped'].items() if n))
+    if not res['filters']:
+        return
+    rejection = args.spec_rejection or []
+    header = '  {:>3} {:8} {:24} {:>3} {:>8} {:>9} {:>9}'.format(
+             '#', 'table', 'filter', 'N', 'q0', 'IL dB', 'RL dB')
+    header += ''.join('{:>11}'.format('@{:g}MHz'.format(x / 1e6)) for x, _ in rejection)
+    if args.spec_delay is not None:
+        header += '{:>11}'.format('dTD ns')
+    if args.spec_bw is not None:
+        header += '{:>11}'.format('BW MHz')
+    print(header)
+    for i, r in enumerate(res['filters']):
+        line = '  {:3d} {:8} {:24} {:3d} {:>8} {:9.3f} {:9.3f}'.format(
+               i + 1, r['table'], r['name'], r['N'],
+               '' if np.isinf(r['q0']) else '{:g}'.format(r['q0']),
+               r['il'], r['rl'])
+        line += ''.join('{:11.3f}'.format(x) for x in r.get('rejection', []))
+        if 'delay' in r:
+            line += '{:11.3f}'.format(r['delay'] * 1e9)
+        if 'bwdb' in r:
+            line += '{:11.5f}'.format(r['bwdb'] / 1e6)
+        print(line)
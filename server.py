@@ -0,0 +1,168 @@
+# rftune serve: a daemon that keeps the tables, the index, the Ness
+# templates and the transfer function cache loaded, answering requests
+# over a unix socket.  Each request is a JSON line, either { "argv":
+# [ ... ] } with the command line of rftune or a record of long option
+# names as in batch jobs, and each answer is a JSON line holding the
+# results, the text rftune would print as "output", and on failure an
+# "error".  Connections are served concurrently on threads.
+#
+# The client side, forward(), only needs the standard library so that
+# rftune can hand a command line to a running server without loading
+# numpy itself.
+
+import io, json, os, socket, sys, threading
+
+
+# the path of the server socket
+def socket_path(path=None):
+    if path:
+        return path
+    if os.environ.get('RFTUNE_SOCKET'):
+        return os.environ['RFTUNE_SOCKET']
+    directory = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.path.join(directory, 'rftune-{}.sock'.format(os.getuid()))
+
+
+# send a request to the server, returning its answer, or None
+# when no server is listening
+def request(req, path=None):
+    path = socket_path(path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps(req).encode() + b'\n')
+            with sock.makefile('rb') as f:
+                line = f.readline()
+    except OSError:
+        return None
+    return json.loads(line) if line else None
+
+
+# run a command line on the server, returning its answer or None
+def forward(argv, path=None):
+    return request({ 'argv': argv }, path)
+
+
+#######################
+# server
+#######################
+
+# sys.stdout replacement that sends the prints of each
+# request thread into the buffer of that thread
+class ThreadStdout:
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def target(self):
+        return getattr(self.local, 'buffer', None) or self.stdout
+
+    def write(self, s):
+        return self.target().write(s)
+
+    def flush(self):
+        self.target().flush()
+
+
+# return the namespace of a request, refusing the options that read
+# or write files, or that do not answer a single request
+def request_args(req, base):
+    from options import make_parser
+    from analysis import job_args
+    if not isinstance(req, dict):
+        raise ValueError('Request is not a JSON object.')
+    if 'argv' not in req:
+        args = job_args(req, base)
+    else:
+        try:
+            args = make_parser().parse_args([ str(x) for x in req['argv'] ])
+        except SystemExit:
+            raise ValueError('Invalid arguments.')
+    if (args.command or args.batch or args.profile or args.cache or args.touchstone or
+            args.stream or args.measured or args.measured2):
+        raise ValueError('Not supported by the server.')
+    return args
+
+
+# answer one request, returning a JSON line
+def answer(req, base):
+    from analysis import run, to_json
+    from reverse import reverse, report_reverse
+    res = {}
+    buffer = io.StringIO()
+    sys.stdout.local.buffer = buffer
+    try:
+        args = request_args(req, base)
+        if args.qequ or args.k12:
+            res['results'] = reverse(args)
+            report_reverse(res['results'], args)
+        else:
+            res['results'] = run(args)
+    except ValueError as e:
+        print(e)
+        res['error'] = str(e)
+    except Exception as e:
+        print('{}: {}'.format(type(e).__name__, e))
+        res['error'] = '{}: {}'.format(type(e).__name__, e)
+    finally:
+        sys.stdout.local.buffer = None
+    res['output'] = buffer.getvalue()
+    return json.dumps(to_json(res), allow_nan=False)
+
+
+# load the tables, their indexes and the Ness templates up front
+def warm():
+    import tables, index, ness
+    for name in tables.MODULES:
+        index.index(name)
+    for n in range(1, 11):
+        ness.groupdelay_template(n)
+
+
+def serve(args):
+    import signal, socketserver
+    import analysis
+    from options import make_parser
+
+    path = socket_path(args.socket)
+    if request({ 'argv': [ '--list' ] }, path) is not None:
+        print('rftune serve is already running on {}'.format(path), file=sys.stderr)
+        return
+    if os.path.exists(path):
+        os.unlink(path)     # left by a server that died
+
+    if args.cache:
+        analysis.cache.persist(args.cache)
+    warm()
+    base = make_parser().parse_args([])
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    req = json.loads(line)
+                except ValueError as e:
+                    reply = json.dumps({ 'error': str(e) })
+                else:
+                    reply = answer(req, base)
+                self.wfile.write(reply.encode() + b'\n')
+                self.wfile.flush()
+
+    sys.stdout = ThreadStdout(sys.stdout)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    umask = os.umask(0o077)     # the socket is for this user only
+    try:
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    finally:
+        os.umask(umask)
+    server.daemon_threads = True
+    print('rftune serving on {}'.format(path), file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -0,0 +1,180 @@
+# the sympy side of ness.py: the generator of the Ness group delay
+# templates, and reference implementations of the transfer functions
+# used to cross-check the numeric evaluators.  Importing this module
+# is what pulls in sympy, so ness.py only does so when it must.
+
+import numpy as np
+import sympy as sy
+import inspect
+
+from ness import nodal_filter, lowpass_xin, lowpass_zin
+
+
+# return the source of the numpy function dphi(g0, ..., gn, wp), the
+# derivative of the lowpass S11 phase of resonator n, for ness.py
+def template_source(n):
+    g = sy.symbols('g0:{}'.format(n + 1))
+    wp = sy.Symbol('wp')
+    phi = -2 * sy.atan(lowpass_xin(g, wp, n) / g[0])
+    fn = sy.lambdify([ *g, wp ], sy.diff(phi, wp), 'numpy', cse=True)
+    return inspect.getsource(fn)
+
+
+# return function fn(f, qu) which calculates the S11 group delay at f
+# for lossy bandpass filters shorted at resonator n
+def fn_groupdelay_tdqu(g, bw, fo, n):
+    f, w, wo, dw, wp, qu = sy.symbols("f w wo dw wp qu")
+    xin = lowpass_xin(g, wp, n)
+    WP = wo / dw * (w / wo - wo / w) - wo * sy.I / (qu * dw)
+    phi = -2 * sy.atan(xin / g[0])
+    GD = -sy.diff(WP, w) * sy.simplify(sy.diff(phi, wp)).subs(wp, WP)
+    GD = GD.subs(dw, 2 * sy.pi * bw)  # sy.pi required
+    GD = GD.subs(wo, 2 * np.pi * fo)  # np.pi required
+    GD = GD.subs(w, 2 * np.pi * f)
+    return sy.lambdify([ f, qu ], abs(GD), 'numpy')
+
+
+# calculate the Ness group delays at fo for a filter with a given QU
+def groupdelay_tdqu(g, bw, fo, qu):
+    w, wo, dw, wp = sy.symbols("w wo dw wp")
+    td = []
+    for n in range(1, len(g)-1):
+        xin = lowpass_xin(g, wp, n)
+        phi = -2 * sy.atan(xin / g[0])
+        WP = wo / dw * (w / wo - wo / w) - wo * sy.I / (qu * dw)
+        GD = -sy.diff(WP, w) * sy.simplify(sy.diff(phi, wp)).subs(wp, WP)
+        GD = GD.subs(w, wo)
+        GD = GD.subs(wo, 2 * sy.pi * fo)
+        GD = GD.subs(dw, 2 * sy.pi * bw)
+        td.append(float(GD.evalf()))
+    return np.array(td)
+
+
+# return function fn(f, qu) which calculates the Ness S11 values
+# for lossy bandpass filters shorted at resonator n
+def fn_groupdelay_maqu(g, bw, fo, n):
+    f, w, wo, dw, wp, qu = sy.symbols("f w wo dw wp qu")
+    xin = lowpass_xin(g, wp, n)
+    WP = wo / dw * (w / wo - wo / w) - wo * sy.I / (qu * dw)
+    xin = xin.subs(wp, WP)
+    s11 = (xin * sy.I - g[0]) / (xin * sy.I + g[0])
+    s11 = s11.subs(wo, 2 * sy.pi * fo)
+    s11 = s11.subs(dw, 2 * sy.pi * bw)
+    s11 = s11.subs(w, 2 * np.pi * f)
+    return sy.lambdify([ f, qu ], s11, 'numpy')
+
+
+# return a function fn(f, qu) for calculating the S11 of a nodal filter
+def fn_nodal_reflection(qk, bw, fo, re=1):
+    lp, cp, cs = nodal_filter(qk, bw, fo)
+    f, w, qu = sy.symbols('f w qu')
+    zin = re
+    for i in reversed(range(len(lp))):
+        zin = 1 / (sy.I * w * cp[i] +
+                   1 / (sy.I * w * lp[i]) +
+                   1 / (w * lp[i] * qu) +
+                   1 / zin
+                  )
+        if i > 0: zin += 1 / (sy.I * w * cs[i-1])
+    s11 = (zin - re) / (zin + re)
+    s11 = s11.subs(w, 2 * np.pi * f)
+    return sy.lambdify([f, qu], s11, 'numpy')
+
+
+# return a function fn(f, qu) for calculating the S21 of a nodal filter
+def fn_nodal_transmission(qk, bw, fo, re=1):
+    lp, cp, cs = nodal_filter(qk, bw, fo)
+    f, w, qu = sy.symbols('f w qu')
+    vin = 1
+    zin = re
+    n = len(lp) - 1
+    for i in range(n):
+        a = 1 / (sy.I * w * cp[i] +
+                 1 / (sy.I * w * lp[i]) +
+                 1 / (w * lp[i] * qu)
+                )
+        vin = vin * a / (a + zin)
+        zin = 1 / (1 / a + 1 / zin)
+        zin += 1 / (sy.I * w * cs[i])
+    a = 1 / (1 / re +
+             sy.I * w * cp[n] +
+             1 / (sy.I * w * lp[n]) +
+             1 / (w * lp[n] * qu)
+            )
+    s21 = 2 * vin * a / (zin + a)
+    s21 = s21.subs(w, 2 * np.pi * f)
+    return sy.lambdify([f, qu], s21, 'numpy')
+
+
+# return function fn(f, qu) which calculates the Ness S11 values
+# for lossy lowpass filters shorted at resonator n
+def fn_lowpass_reflection(g, fo, n):
+    f, w, wo, wp, qu = sy.symbols("f w wo wp qu")
+    xin = lowpass_zin(g, wp, qu, n)
+    xin = xin.subs(wp, w / wo)
+    xin = xin.subs(wo, 2 * sy.pi * fo)
+    xin = xin.subs(w, 2 * sy.pi * f)
+    s11 = (xin - g[0]) / (xin + g[0])
+    return sy.lambdify([ f, qu ], s11, 'numpy')
+
+
+def fn_lowpass_transmission(g, fo):
+    f, wp, qu = sy.symbols("f wp qu")
+    vin = 1
+    zin = g[0]
+    for i in range(1, len(g)-1):
+        G = wp * g[i] * sy.I
+        if i % 2:
+            a = 1 / G
+            vin = vin * a / (a + zin)
+            zin = 1 / (1 / a + 1 / zin)
+        else:
+            zin += G + wp * g[i] / qu
+    s21 = 2 * vin * g[-1] / (zin + g[-1])
+    s21 = s21.subs(wp, f / fo)
+    return sy.lambdify([f, qu], s21, 'numpy')
+
+
+#######################
+# cross-checks
+#######################
+
+# largest relative difference between two functions fn(f, qu)
+def compare(fn1, fn2, f, qu):
+    a, b = fn1(f, qu), fn2(f, qu)
+    return np.nanmax(abs(a - b) / np.maximum(abs(b), 1e-300))
+
+
+# compare the numeric evaluators in ness.py against the sympy
+# references for a filter, returning the worst relative error
+def crosscheck(g, bw, fo, qu, re=1, points=101):
+    import ness
+    qk = ness.coupling_g(g)
+    f = np.linspace(fo - 2 * bw, fo + 2 * bw, points)
+    fp = np.linspace(fo / points, 2 * fo, points)
+    err = {
+        'nodal_reflection': compare(
+            ness.fn_nodal_reflection(qk, bw, fo, re=re),
+            fn_nodal_reflection(qk, bw, fo, re=re), f, qu),
+        'nodal_transmission': compare(
+            ness.fn_nodal_transmission(qk, bw, fo, re=re),
+            fn_nodal_transmission(qk, bw, fo, re=re), f, qu),
+        'lowpass_transmission': compare(
+            ness.fn_lowpass_transmission(g, fo),
+            fn_lowpass_transmission(g, fo), fp, qu),
+    }
+    td1 = ness.groupdelay_tdqu(g, bw, fo, qu)
+    td2 = groupdelay_tdqu(g, bw, fo, qu)
+    err['groupdelay_tdqu'] = np.max(abs(td1 - td2) / abs(td2))
+    for n in range(1, len(g)-1):
+        err['groupdelay_tdqu{}'.format(n)] = compare(
+            ness.fn_groupdelay_tdqu(g, bw, fo, n),
+            fn_groupdelay_tdqu(g, bw, fo, n), f, qu)
+        err['groupdelay_maqu{}'.format(n)] = compare(
+            ness.fn_groupdelay_maqu(g, bw, fo, n),
+            fn_groupdelay_maqu(g, bw, fo, n), f, qu)
+        err['lowpass_reflection{}'.format(n)] = compare(
+            ness.fn_lowpass_reflection(g, fo, n),
+            fn_lowpass_reflection(g, fo, n), fp, qu)
+    return err
+
@@ -0,0 +1,183 @@
+# the coefficient tables COUPLED, ZVEREV and LOWPASS, loaded lazily
+# on first access from the precompiled store tables.npz.  Each table
+# is kept as one flat float64 array of all its rows together with
+# the offset of every row and the family, pole count and q0 of the
+# row, and only the arrays of the tables used are decompressed.  Run
+# this file to rebuild tables.npz after editing coupled.py, zverev.py
+# or lowpass.py; the store falls back to those modules when it is
+# missing or was built from different versions of them.
+#
+# The families with a generator in ness are synthesized for the orders
+# their tables lack, and "python tables.py N" adds the synthesized rows
+# of up to N poles to the store.
+
+import numpy as np
+import functools, hashlib, importlib, io, os, pkgutil, sys
+
+STORE = 'tables.npz'
+MODULES = { 'COUPLED': 'coupled', 'ZVEREV': 'zverev', 'LOWPASS': 'lowpass' }
+
+# the table key of the synthesized rows of each family with a generator
+SYNTHESIS = { 'butterworth': 'Butterworth', 'bessel': 'Bessel',
+              'gaussian': 'Gaussian', 'legendre': 'Legendre' }
+
+tables = {}
+store = None
+
+
+# pole count and q0 of a row of the named table
+def row_poles(name, row):
+    if name == 'LOWPASS':
+        return len(row) - 2, np.inf
+    if name == 'ZVEREV':
+        return len(row) - 3, row[0]
+    return len(row) - 1, np.inf
+
+
+# pack a table of { family: [ row, ... ] } into flat arrays
+def pack(name, table):
+    families, values, offsets, family, poles, q0 = [], [], [0], [], [], []
+    for i, (key, rows) in enumerate(table.items()):
+        families.append(key)
+        for row in rows:
+            n, q = row_poles(name, row)
+            values.extend(row)
+            offsets.append(len(values))
+            family.append(i)
+            poles.append(n)
+            q0.append(q)
+    return {
+        name + '_families': np.array(families),
+        name + '_values': np.array(values, dtype=float),
+        name + '_offsets': np.array(offsets, dtype=np.int64),
+        name + '_family': np.array(family, dtype=np.int32),
+        name + '_poles': np.array(poles, dtype=np.int32),
+        name + '_q0': np.array(q0, dtype=float),
+    }
+
+
+# unpack the named table from the store back into { family: [ row, ... ] }
+def unpack(name, store):
+    families = store[name + '_families']
+    values = store[name + '_values']
+    offsets = store[name + '_offsets']
+    family = store[name + '_family']
+    table = { str(key): [] for key in families }
+    for i in range(len(family)):
+        row = values[offsets[i]:offsets[i+1]].tolist()
+        table[str(families[family[i]])].append(row)
+    return table
+
+
+# digest of the table modules next to this file, or None without them
+def digest():
+    here = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha1()
+    for module in MODULES.values():
+        try:
+            with open(os.path.join(here, module + '.py'), 'rb') as f:
+                h.update(f.read())
+        except OSError:
+            return None
+    return h.hexdigest()
+
+
+def build(filename=None, order=None):
+    arrays = { 'digest': np.array(digest()) }
+    for name, module in MODULES.items():
+        table = getattr(importlib.import_module(module), name)
+        if order:
+            table = extend(name, table, order)
+        arrays.update(pack(name, table))
+    filename = filename or os.path.join(os.path.dirname(os.path.abspath(__file__)), STORE)
+    np.savez_compressed(filename, **arrays)
+
+
+class Store:
+    """
+    The arrays of tables.npz, each decompressed on its first access
+    rather than all of them when the store is opened.
+    """
+    def __init__(self, npz=None):
+        self.npz = npz
+        self.arrays = {}
+
+    def __contains__(self, key):
+        return self.npz is not None and key in self.npz.files
+
+    def __getitem__(self, key):
+        if key not in self.arrays:
+            self.arrays[key] = self.npz[key]
+        return self.arrays[key]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+def read_store():
+    global store
+    if store is None:
+        try:
+            data = pkgutil.get_data(__name__, STORE)
+        except OSError:
+            data = None
+        store = Store(np.load(io.BytesIO(data)) if data else None)
+        # the store is stale when built from other table modules
+        source = digest()
+        if source and str(store.get('digest')) != source:
+            store = Store()
+    return store
+
+
+# the key and row of the named table for a family without a parameter
+# and n poles synthesized by its ness generator, or None.  COUPLED rows
+# are the q1 qn k12 ... of the same prototype; the predistorted ZVEREV
+# rows can not be synthesized.
+@functools.lru_cache(maxsize=256)
+def synthesize(name, family, n):
+    if name == 'ZVEREV' or family not in SYNTHESIS or n < 2:
+        return None
+    import ness
+    g = getattr(ness, family)(n)
+    if name == 'COUPLED':
+        qk = ness.coupling_g(g)
+        row = [ qk[0], qk[-1] ] + list(qk[1:-1])
+    else:
+        row = list(g)
+    return SYNTHESIS[family], tuple(float(x) for x in row)
+
+
+# the table with the synthesized rows it lacks of up to order poles
+def extend(name, table, order):
+    table = { key: list(rows) for key, rows in table.items() }
+    for family in SYNTHESIS:
+        for n in range(2, order + 1):
+            res = synthesize(name, family, n)
+            if res is None:
+                return table
+            key, row = res
+            rows = table.setdefault(key, [])
+            if not any(row_poles(name, r)[0] == n for r in rows):
+                rows.append(list(row))
+                rows.sort(key=lambda r: row_poles(name, r)[0])
+    return table
+
+
+def load(name):
+    if name not in tables:
+        store = read_store()
+        if name + '_values' in store:
+            tables[name] = unpack(name, store)
+        else:
+            tables[name] = getattr(importlib.import_module(MODULES[name]), name)
+    return tables[name]
+
+
+def __getattr__(name):
+    if name in MODULES:
+        return load(name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+if __name__ == '__main__':
+    build(order=int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,105 @@
+# Touchstone files: writing the predicted S-parameters of nodal
+# filters, and reading measured ones.  Sweeps are evaluated and written
+# in chunks of CHUNK points so that the memory used stays bounded
+# however many points are written.  Files are read in bulk, parsing all
+# the numbers with one call after the comments are stripped.
+
+import numpy as np
+import re
+
+from ness import fn_nodal_reflection, fn_nodal_transmission
+
+CHUNK = 65536
+
+
+# yield the frequencies of a sweep of count points in chunks
+def chunks(start, stop, count, size=CHUNK):
+    step = (stop - start) / (count - 1) if count > 1 else 0
+    for i in range(0, count, size):
+        yield start + step * np.arange(i, min(i + size, count))
+
+
+# write S11, or S11, S21, S12 and S22 for a .s2p file, of a filter
+# over a sweep (start, stop, count) as real and imaginary parts;
+# re is the ratio of the port impedance zo to the filter impedance
+def write(filename, qk, bw, fo, qu, sweep, re=1, zo=50, comments=()):
+    fns = [ fn_nodal_reflection(qk, bw, fo, re=re) ]
+    order = [ 0 ]
+    if filename.lower().endswith('.s2p'):
+        fns.append(fn_nodal_transmission(qk, bw, fo, re=re))
+        fns.append(fn_nodal_reflection(qk[::-1], bw, fo, re=re))
+        order = [ 0, 1, 1, 2 ]
+    fmt = ' '.join([ '%.10g' ] * (1 + 2 * len(order))) + '\n'
+    with open(filename, 'w') as f:
+        for line in comments:
+            f.write('! {}\n'.format(line))
+        f.write('# HZ S RI R {:g}\n'.format(zo))
+        for freq in chunks(*sweep):
+            s = [ fn(freq, qu) for fn in fns ]
+            cols = [ freq ]
+            for i in order:
+                cols += [ s[i].real, s[i].imag ]
+            f.write((fmt * len(freq)) % tuple(np.column_stack(cols).ravel()))
+
+
+#######################
+# reading
+#######################
+
+UNITS = { 'HZ': 1, 'KHZ': 1e3, 'MHZ': 1e6, 'GHZ': 1e9 }
+
+
+# read a touchstone file, returning the frequencies in Hz and the
+# S-parameters as a complex array of shape (points, ports, ports)
+def read(filename):
+    m = re.search(r'\.s(\d+)p$', filename.lower())
+    ports = int(m.group(1)) if m else 1
+    with open(filename) as f:
+        text = re.sub(r'!.*', '', f.read())
+    unit, fmt = 'GHZ', 'MA'     # the touchstone defaults
+    m = re.search(r'^[ \t]*#(.*)$', text, re.MULTILINE)
+    if m:
+        for option in m.group(1).upper().split():
+            if option in UNITS:
+                unit = option
+            elif option in ('RI', 'MA', 'DB'):
+                fmt = option
+        text = text[m.end():]
+    values = np.fromstring(text, sep=' ')
+    width = 1 + 2 * ports * ports
+    if len(values) % width:
+        raise ValueError('{}: expected {} values per frequency.'.format(filename, width))
+    values = values.reshape(-1, width)
+    a, b = values[:,1::2], values[:,2::2]
+    if fmt == 'RI':
+        s = a + 1j * b
+    elif fmt == 'MA':
+        s = a * np.exp(1j * np.radians(b))
+    else:
+        s = 10**(a / 20) * np.exp(1j * np.radians(b))
+    s = s.reshape(-1, ports, ports)
+    if ports == 2:
+        s = s.transpose(0, 2, 1)    # two ports are listed S11 S21 S12 S22
+    return values[:,0] * UNITS[unit], s
+
+
+# the group delay of s over the frequencies f from its unwrapped
+# phase, by central differences over aperture points on either side
+def groupdelay(f, s, aperture=1):
+    if aperture < 1:
+        raise ValueError('The aperture must be at least 1 point.')
+    phase = np.unwrap(np.angle(s))
+    w = 2 * np.pi * f
+    if aperture == 1:
+        return -np.gradient(phase, w)
+    a = aperture
+    td = np.full(len(f), np.nan)
+    td[a:-a] = -(phase[2*a:] - phase[:-2*a]) / (w[2*a:] - w[:-2*a])
+    return td
+
+
+# return the group delay and the reflection coefficient of s11 at fo
+def extract(f, s11, fo, aperture=1):
+    td = groupdelay(f, s11, aperture)
+    ok = np.isfinite(td)
+    return np.interp(fo, f[ok], td[ok]), np.interp(fo, f, abs(s11))
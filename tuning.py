@@ -0,0 +1,187 @@
+# streaming tuning mode behind --stream: measurements are read line by
+# line from a file, stdin or a FIFO, and QU, QE and K12 are extracted
+# from each as it arrives.  A line holds the return loss RL1 in dB at
+# resonator 1 and the Ness group delays TD1 ... TDn in ns measured so
+# far; blank lines and lines starting with # are skipped.  When a
+# filter is selected, its Ness delays and RL1 from groupdelay_tdqu and
+# groupdelay_maqu are computed once as targets, and every result is
+# compared against them.  The per-line work is plain python arithmetic.
+
+import os, stat, sys
+
+from reverse import qequ_groupdelay, k12_groupdelay
+
+
+# return the targets of the filter selected by args, or None
+def targets(args):
+    if not args.number:
+        return None
+    import numpy as np
+    from analysis import select_filters
+    from ness import groupdelay_tdqu, groupdelay_maqu, groupdelay_qk, db
+    fo, bw, qu = args.frequency, args.bandwidth, args.qu
+    if not (fo and bw):
+        raise ValueError('Center frequency and bandwidth not set.')
+    data = select_filters(args)
+    if not data:
+        raise ValueError('Filter not found.')
+    d = data[0]
+    qk, g = d['qk'], d['g']
+    if np.isinf(qu):
+        td = groupdelay_qk(qk, bw)
+        ma = np.ones(len(td))
+    else:
+        td = groupdelay_tdqu(g, bw, fo, qu)
+        ma = groupdelay_maqu(g, bw, fo, qu)
+    return {
+        'name': d['name'],
+        'TD': [ float(x) for x in td ],
+        'RL1': float(db(1 / ma[0])),
+        'QE': fo / bw * qk[0],
+        'K12': qk[1] * bw / fo,
+        'K': [ x * bw / fo for x in qk[1:-1] ],
+    }
+
+
+# return the result line of the return loss rl in dB at resonator 1
+# and the Ness group delays td in seconds
+def evaluate(rl, td, fo, target):
+    ma1 = 10**(-rl / 20)
+    qe, qu = qequ_groupdelay(fo, td[0], ma1)
+    k12 = k12_groupdelay(fo, td[0], td[1], ma1) if len(td) > 1 else None
+    out = [ 'QU = {:9.3f}'.format(qu), 'QE = {:9.3f}'.format(qe) ]
+    if k12 is not None:
+        out.append('K12 = {:9.6f}'.format(k12))
+    if target:
+        out.append('|')
+        out.append('QE {:+.2%}'.format(qe / target['QE'] - 1))
+        if k12 is not None:
+            out.append('K12 {:+.2%}'.format(k12 / target['K12'] - 1))
+        out.append('RL1 {:+.3f} dB'.format(rl - target['RL1']))
+        for n, x in enumerate(td[:len(target['TD'])]):
+            out.append('TD{} {:+.3f} ns'.format(n + 1, (x - target['TD'][n]) * 1e9))
+    return '  '.join(out)
+
+
+# return the result line of a measurement line
+def measure(line, fo, target):
+    values = [ float(x) for x in line.replace(',', ' ').split() ]
+    if len(values) < 2:
+        raise ValueError('expected RL1 TD1 [TD2 ... TDn]')
+    return evaluate(values[0], [ x * 1e-9 for x in values[1:] ], fo, target)
+
+
+# print the targets of the selected filter
+def report_targets(target):
+    print('{} targets: QE = {:.3f}  K12 = {:.6f}  RL1 = {:.3f} dB  {}'.format(
+          target['name'], target['QE'], target['K12'], target['RL1'],
+          '  '.join('TD{} = {:.3f} ns'.format(n + 1, x * 1e9)
+                    for n, x in enumerate(target['TD']))), flush=True)
+
+
+# print the result of every measurement read from f as it arrives
+def follow(f, fo, target):
+    for line in iter(f.readline, ''):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            print(measure(line, fo, target), flush=True)
+        except (ValueError, ZeroDivisionError) as e:
+            print('error: {}: {}'.format(line, e), flush=True)
+
+
+def stream(args):
+    fo = args.frequency
+    if not fo:
+        raise ValueError("Center frequency not set.")
+    target = targets(args)
+    if target:
+        report_targets(target)
+    if args.stream == '-':
+        follow(sys.stdin, fo, target)
+        return
+    # a FIFO is reopened when its writer closes it
+    try:
+        fifo = stat.S_ISFIFO(os.stat(args.stream).st_mode)
+    except OSError as e:
+        raise ValueError(e)
+    while True:
+        with open(args.stream) as f:
+            follow(f, fo, target)
+        if not fifo:
+            return
+
+
+# the name of the coupling between resonators i and j
+def coupling_name(i, j):
+    return 'K{}{}'.format(i, j) if j < 10 else 'K{},{}'.format(i, j)
+
+
+# return the result line of every coupling extracted from the Ness
+# delays td1 and return loss rl1 of port 1, and optionally td2 and rl2
+# of port 2, solved for the lossy filter
+def couplings(fo, rl1, td1, target, rl2=None, td2=None):
+    from ness import extract_qk, extract_couplings
+    if td2 is None:
+        qe, qu, k = extract_qk(fo, td1, 10**(-rl1 / 20))
+        out = [ 'QU = {:9.3f}'.format(qu), 'QE = {:9.3f}'.format(qe) ]
+    else:
+        qe, qe2, qu, k = extract_couplings(
+            fo, td1, 10**(-rl1 / 20), td2, 10**(-rl2 / 20))
+        out = [ 'QU = {:9.3f}'.format(qu), 'QE1 = {:9.3f}'.format(qe),
+                'QE2 = {:9.3f}'.format(qe2) ]
+    out += [ '{} = {:9.6f}'.format(coupling_name(i + 1, i + 2), x)
+             for i, x in enumerate(k) ]
+    if target:
+        out.append('|')
+        out += [ '{} {:+.2%}'.format(coupling_name(i + 1, i + 2), x / t - 1)
+                 for i, (x, t) in enumerate(zip(k, target['K'])) ]
+    return '  '.join(out)
+
+
+# read the measured S11 sweeps of filenames, printing and returning
+# the return losses in dB and the Ness group delays in seconds at fo;
+# without fo, it is taken at the group delay peak of the first sweep
+def sweeps(filenames, fo, aperture):
+    import numpy as np
+    import touchstone
+    rl, td = [], []
+    for filename in filenames:
+        try:
+            f, s = touchstone.read(filename)
+        except OSError as e:
+            raise ValueError(e)
+        s11 = s[:,0,0]
+        if not fo:
+            fo = f[np.nanargmax(touchstone.groupdelay(f, s11, aperture))]
+            print('fo = {:.6g} Hz from the group delay peak'.format(fo))
+        x, ma = touchstone.extract(f, s11, fo, aperture)
+        rl.append(float(-20 * np.log10(ma)))
+        td.append(float(x))
+        print('{:30s} TD{} = {:9.3f} ns  RL = {:7.3f} dB'.format(
+              filename, len(td), td[-1] * 1e9, rl[-1]))
+    return rl, td, fo
+
+
+# extract the Ness group delay and return loss at fo from the measured
+# S11 sweeps in args.measured, the first with resonator 1 tuned and the
+# rest shorted, the second with resonators 1 and 2, and so on, then
+# print QU, QE and K12 calculated from them; without a center
+# frequency, fo is taken at the group delay peak of the first sweep.
+# Beyond K12, or with the sweeps from port 2 in args.measured2, every
+# coupling is extracted for the lossy filter.
+def measured(args):
+    if not args.measured:
+        raise ValueError('--measured2 needs the sweeps from port 1 in --measured.')
+    fo = args.frequency
+    target = targets(args) if fo else None
+    if target:
+        report_targets(target)
+    rl, td, fo = sweeps(args.measured, fo, args.aperture)
+    print(evaluate(rl[0], td, fo, target))
+    if args.measured2:
+        rl2, td2, fo = sweeps(args.measured2, fo, args.aperture)
+        print(couplings(fo, rl[0], td, target, rl2[0], td2))
+    elif len(td) > 2:
+        print(couplings(fo, rl[0], td, target))
@@ -902,7 +902,7 @@ ZVEREV = {
     [ 6.820,3.165,0.1871,0.2348,3.1536,1.5936,0.7111,0.7179,2.3589 ],
     [ 6.820,3.165,0.3048,0.1581,2.4013,0.8468,0.6309,1.4197,3.4918 ],
     [ 3.410,6.467,0.1204,1.3993,4.6927,2.1805,1.4863,1.0919,0.6272 ],
-    [ 3.410,6.467,0.1553,3.3879,3.7110,1.7977,1.2727,0.6493,0.9261 ],
+    [ 3.410,6.467,0.1553,0.3879,3.7110,1.7977,1.2727,0.6493,0.9261 ],
     [ 3.410,6.467,0.2007,0.2479,2.8972,1.5238,0.6940,0.6853,2.1754 ],
     [ 3.410,6.467,0.3205,0.1696,2.2774,0.8380,0.6035,1.3115,3.1827 ],
     [ 2.273,9.910,0.1319,1.1739,4.2126,1.9955,1.3950,1.0483,0.6105 ],
@@ -1260,7 +1260,7 @@ ZVEREV = {
     [ 43.406,1.375,0.8214,2.4006,0.8474,0.5611,0.5160,0.5468,0.6563 ],
     [ 43.406,1.375,1.1062,1.3699,0.6625,0.5627,0.5775,0.4737,0.7502 ],
     [ 28.937,2.604,0.7819,3.2375,0.8667,0.5599,0.5104,0.5371,0.6741 ],
-    [ 28.967,2.604,1.4611,1.1069,0.7577,0.4248,0.6226,0.5504,0.6321 ],
+    [ 28.937,2.604,1.4611,1.1069,0.7577,0.4248,0.6226,0.5504,0.6321 ],
     [ 21.703,4.039,0.7719,4.0612,0.8660,0.5549,0.5031,0.5280,0.6957 ],
     [ 21.703,4.039,1.5331,1.1242,0.7601,0.3823,0.6631,0.5360,0.6013 ],
     [ 17.362,5.740,0.7733,4.9367,0.8563,0.5478,0.4943,0.5168,0.7201 ],